@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+# Benchmarks for boar, run with `python bench.py [name]` to run a single one, or without arguments to run all of them
+
+import sys
+import json
+import random
+import tracemalloc
+import gc
+import os
+import io
+import time
+import tempfile
+import contextlib
+import subprocess
+
+import boar
+import boar_complete
+
+
+def generate_book(n_items, n_cats=100, seed=1):
+    """Generate a book with n_items items spread over n_cats categories, about half of them with a description, link or tags"""
+
+    rand = random.Random(seed)
+    hosts = [f"https://site{x}.example.com" for x in range(50)]
+    tags = [f"tag{x}" for x in range(30)]
+
+    book = []
+    for i in range(n_cats):
+        items = []
+        for j in range(n_items // n_cats):
+            item = {
+                "name": f"Item {i}-{j}",
+                "desc": f"A description of item {j} in category {i}" if rand.random() < 0.5 else None,
+                "link": f"{rand.choice(hosts)}/path/{i}/{j}" if rand.random() < 0.5 else None
+            }
+            if rand.random() < 0.3:
+                item["tags"] = rand.sample(tags, 2)
+            items.append(item)
+        book.append({"name": f"Category {i}", "short": f"cat{i}", "items": items})
+    boar.assign_ids(book)
+    return book
+
+
+def measure(load):
+    """Return the memory (bytes) retained by the object returned by load() and the peak memory while loading"""
+
+    gc.collect()
+    tracemalloc.start()
+    book = load()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del book
+    return current, peak
+
+
+def bench_memory():
+    """Resident memory of a book loaded as dicts versus as compact Category and Item objects"""
+
+    print("memory: items, dicts (MB), dicts peak while loading (MB), compact (MB), compact peak while loading (MB), saved")
+    for n_items in [100_000, 1_000_000]:
+        data = json.dumps(generate_book(n_items))
+
+        # check that converting is lossless
+        assert json.dumps(json.loads(data, object_hook=boar.compact_hook), default=boar.plain) == data
+
+        dicts, dicts_peak = measure(lambda: json.loads(data))
+        compact, compact_peak = measure(lambda: json.loads(data, object_hook=boar.compact_hook))
+        print(f"{n_items:>9} {dicts / 2**20:>10.1f} {dicts_peak / 2**20:>10.1f} {compact / 2**20:>10.1f} {compact_peak / 2**20:>10.1f} {1 - compact / dicts:>8.0%}")
+
+
+def make_data_dir(book):
+    """Create a data directory in a temporary directory, returns its path"""
+
+    path = tempfile.mkdtemp() + "/"
+    os.mkdir(path + "history")
+    boar.write_book(path, book)
+    return path
+
+
+def timed(function, *args):
+    """Run a command function quietly, returns (seconds taken, its return value)"""
+
+    start = time.perf_counter()
+    result = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            result = function(*args)
+        except SystemExit:
+            pass
+    return time.perf_counter() - start, result
+
+
+def bench_sync():
+    """Syncing two 100k item books that are the same, and that have a few differences since a common ancestor"""
+
+    conf = {"disable colors": True}
+    book = generate_book(100_000)
+    path = make_data_dir(book)
+    other_path = make_data_dir(book)
+    seconds, _ = timed(boar.sync, path, other_path, book, conf)
+    print(f"sync: same books {seconds * 1000:.1f} ms")
+
+    # change a few items in the other book, keeping the original in its history
+    other = json.loads(json.dumps(book))
+    boar.save_to_history(other_path, other, {"history length": 5})
+    for n in range(5):
+        other[n * 20]["items"][n]["desc"] = f"Changed {n}"
+    boar.write_book(other_path, other)
+    seconds, merged = timed(boar.sync, path, other_path, book, conf)
+    assert merged[20]["items"][1]["desc"] == "Changed 1"
+    print(f"sync: 5 changed items {seconds * 1000:.1f} ms")
+
+
+def bench_completion():
+    """Completing item IDs of a 100k item book, as a lookup in the completion index and as a whole process run the way the shell scripts do"""
+
+    path = make_data_dir(generate_book(100_000))
+    start = time.perf_counter()
+    boar_complete.complete_lookup(path + "completion", "i cat5.1")
+    print(f"completion: lookup {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    # the data directory is found from the home directory
+    home = tempfile.mkdtemp()
+    os.rename(path, home + "/.boar")
+    env = dict(os.environ, HOME=home, PYTHONPATH=os.path.dirname(os.path.realpath(boar.__file__)))
+    runs = []
+    for _ in range(10):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "boar_complete", "rm", "cat5.1"], env=env, stdout=subprocess.DEVNULL, check=True)
+        runs.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    print(f"completion: process {min(runs) * 1000:.1f} ms (of which starting python {(time.perf_counter() - start) * 1000:.1f} ms)")
+
+
+def bench_compression():
+    """Size of a 100k item book and the time taken to save and load it with each compression"""
+
+    book = generate_book(100_000)
+    print("compression: codec, size (MB), save (ms), load (ms), undo (ms)")
+    for compression in ["none", "gzip", "lzma", "zlib"]:
+        path = make_data_dir(book)
+        boar.save_to_history(path, book, {"history length": 5, "compression": compression})
+        start = time.perf_counter()
+        boar.write_book(path, book, compression)
+        save = time.perf_counter() - start
+        size = os.path.getsize(path + "book")
+        start = time.perf_counter()
+        assert boar.load_json(path + "book") == book
+        load = time.perf_counter() - start
+        undo, _ = timed(boar.undo, path)
+        print(f"{compression:>13} {size / 2**20:>10.1f} {save * 1000:>10.0f} {load * 1000:>10.0f} {undo * 1000:>10.0f}")
+
+
+def bench_diff():
+    """Diffing a 100k item book with the previous version in history, with a few changed, moved and added items"""
+
+    conf = {"disable colors": True, "history length": 5}
+    book = generate_book(100_000)
+    path = make_data_dir(book)
+    edited = json.loads(json.dumps(book))
+    for n in range(5):
+        edited[n * 20]["items"][n]["desc"] = f"Changed {n}"
+    edited[1]["items"].append(edited[2]["items"].pop(0))
+    edited[3]["items"].append({"name": "New item", "desc": None, "link": None})
+    boar.save_book(path, edited, book, conf)
+    seconds, _ = timed(boar.diff, path, "", conf)
+    print(f"diff: {seconds * 1000:.1f} ms")
+
+
+benchmarks = {
+    "memory": bench_memory,
+    "sync": bench_sync,
+    "completion": bench_completion,
+    "compression": bench_compression,
+    "diff": bench_diff,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or benchmarks:
+        benchmarks[name]()
@@ -4,7 +4,21 @@
 
 import argparse  # module for parsing arguments passed from the command line
 import os
+import sys
 import json
+import re
+import hashlib
+import bisect
+import collections
+import collections.abc
+import time
+import datetime
+import gzip
+import lzma
+import zlib
+import shlex
+import tempfile
+import subprocess
 
 
 def create_data_dir(dotfile_path, dot_config_path, home):
@@ -27,6 +41,10 @@ def create_data_dir(dotfile_path, dot_config_path, home):
             exit(f"The directory '{home}/.config/' was not found.")
 
 
+# default history retention tiers, see parse_retention
+RETENTION = "1h:all,1d:1h,30d:1d"
+
+
 def create_defaults(path_loc, create_book=False, create_conf=False, create_history_dir=False):
     """Create necessary files in data directory"""
     
@@ -53,18 +71,19 @@ def create_defaults(path_loc, create_book=False, create_conf=False, create_histo
     # configuration
     conf = {
         "history length": 5,
+        "history retention": RETENTION,
         "max display": 15,
         "show all": "all",
         "disable colors": False,
         "show links": True,
         "clear": "cl",
-        "export light by default": True
+        "export light by default": True,
+        "compression": "none"
     }
 
     # create the book file for storing the data in the book
     if create_book:
-        with open(path_loc + "book", "w") as book_file:
-            json.dump(book, book_file)
+        write_book(path_loc, book)
     # create the config file
     if create_conf:
         with open(path_loc + "conf", "w") as conf_file:
@@ -139,12 +158,109 @@ def prompt(message, default="y", positive=True, negative=True, custom=False, add
     exit("Unable to understand.")
         
 
-def ls(args, book, conf):
-    """Show the contents of the book or a specific category
+def parse_tags(text):
+    """Parse a comma separated string of tags into a list of lowercase tags"""
+    
+    tags = []
+    for tag in text.lower().split(","):
+        tag = tag.strip()
+        if not tag:
+            continue
+        if not valid_tag(tag):
+            exit(f"Tag '{tag}' must be composed of alphanumeric characters, '-' and '_'.")
+        if tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def valid_tag(tag):
+    """Check that a tag is composed of alphanumeric characters, '-' and '_'"""
+    
+    return bool(tag) and all(x.isalnum() or x in "-_" for x in tag)
+
+
+def tag_index(book):
+    """
+    Build an inverted index of tags, returns a dict of tag -> set of (category index, item index) of the items having it
+    Only tagged items are added, so the index is as large as the number of tags on items, not tags times items.
+    """
+    
+    index = {}
+    for i, cat in enumerate(book):
+        for j, item in enumerate(cat["items"]):
+            for tag in item.get("tags") or ():
+                index.setdefault(tag, set()).add((i, j))
+    return index
+
+
+def tag_filter(book, tags, not_tags, indexes=None):
+    """
+    Return a set of (category index, item index) of items having all of the tags and none of not_tags
+    indexes: [list] indexes of the categories to look in, all of them by default
+    """
+    
+    # a single pass with set checks per item, building index sets for common tags would cost more than the pass itself
+    wanted, unwanted = set(tags), set(not_tags)
+    found = set()
+    for i in range(len(book)) if indexes is None else indexes:
+        for j, item in enumerate(book[i]["items"]):
+            item_tags = item.get("tags") or ()
+            if wanted.issubset(item_tags) and unwanted.isdisjoint(item_tags):
+                found.add((i, j))
+    return found
+
+
+def print_cat(id1, cat, longest_id, conf):
+    """Print the header line of a category in ls"""
+    
+    # write the category ID
+    print(color(str(id1), conf, "purple", "ul") + color(" ", conf, "purple", "ul") * (longest_id - len(str(id1))), end=color(" ", conf, "purple", "ul"))
+    # write the category name
+    print(color(cat["name"] + " ", conf, "purple", "ul"), end=" ")
+    # write the stable ID if asked for
+    if conf.get("show ids") and cat.get("id"):
+        print(color("@" + cat["id"], conf, "black", "bold"), end=" ")
+    # write the short version of the category name if present
+    if cat["short"]:
+        print(f"({color(cat['short'], conf, 'cyan')})")
+    else:
+        # add newline
+        print()
+
+
+def print_item(id1, id2, item, longest_id, conf, show_link):
+    """Print an item in ls, along with its link on the next line if show_link is True"""
+    
+    # write the item ID
+    print(str(id1) + "." + str(id2) + " " * (longest_id - len(str(id1)) - 1 - len(str(id2))), end="  - ")
+    # write the item name
+    print(color(item["name"], conf, "white", "hi"), end=" ")
+    # write the stable ID if asked for
+    if conf.get("show ids") and item.get("id"):
+        print(color("@" + item["id"], conf, "black", "bold"), end=" ")
+    # indicate the presence of a link if exists
+    if item["link"]:
+        print(color("[L]", conf, "black", "bold"), end=" ")
+    # add ':' before description
+    print(":", end=" ")
+    # write the description if it exists
+    print(item["desc"] if item["desc"] else "...", end="")
+    # write the tags if there are any
+    if item.get("tags"):
+        print(" " + color(" ".join("#" + x for x in item["tags"]), conf, "cyan"), end="")
+    print()
+    
+    # if link is present, write it in a new line
+    if item["link"] and show_link:
+        print(" " * (longest_id + 5), "link:", color(item["link"], conf, "black", "bold"))
+
+
+def ls(args, book, conf, tags=None, not_tags=None):
+    """Show the contents of the book or a specific category, optionally only items with all of the tags and none of not_tags
     format:
     ID Name (short) – description
     2   Template Category  (temp)
-    2.1  - Template entry [L] : a good description about the entry
+    2.1  - Template entry [L] : a good description about the entry #tag
              link: https://example.com
     2.2  - A second entry : ..."""
     
@@ -156,14 +272,14 @@ def ls(args, book, conf):
         exit()
     
     # if asked for a non-existent category, say as much and exit
-    if args and args not in [x["short"] for x in book] + [str(x) for x in range(1, len(book) + 1)] + [conf['show all']]:
+    if args and args.lower() != conf["show all"] and find_cat(args, book) is None:
         exit("Category doesn't exist.")
     
     # find the amount of characters the longest ID takes to display
     longest_id = len(str(len(book))) + 1 + len(str(max([len(x["items"]) for x in book])))
-
-    # if the total amount of items is higher than configured, show lscat instead, unless 'all' is given
-    if sum([len(x["items"]) + 1 for x in book]) > conf["max display"] and not args:
+    
+    # if the total amount of items is higher than configured, show lscat instead, unless 'all' is given or filtering by tags
+    if sum([len(x["items"]) + 1 for x in book]) > conf["max display"] and not args and not tags and not not_tags:
         lscat(book, conf)
         exit()
     
@@ -171,40 +287,30 @@ def ls(args, book, conf):
     if args.lower() == conf["show all"]:
         args = None
     
+    # only print categories that have something to show
+    selected = find_cat(args, book) if args else None
+    cats = [(id1, cat) for id1, cat in enumerate(book, 1) if not args or id1 - 1 == selected]
+    
+    # find the items to show if filtering by tags, only in the categories being shown
+    shown = tag_filter(book, tags or [], not_tags or [], [id1 - 1 for id1, _ in cats]) if tags or not_tags else None
+    if shown is not None and not shown:
+        exit("No items found with the given tags.")
+    if shown is not None:
+        shown_items = {}
+        for i, j in sorted(shown):
+            shown_items.setdefault(i, []).append(j)
+        cats = [(id1, cat) for id1, cat in cats if id1 - 1 in shown_items]
+    
     print("BOAR - Book Of All References")
-    for id1, cat in enumerate(book, 1):
-        if not args or args in [str(id1), cat["short"]]:
-            # write the category ID
-            print(color(str(id1), conf, "purple", "ul") + color(" ", conf, "purple", "ul") * (longest_id - len(str(id1))), end=color(" ", conf, "purple", "ul"))
-            # write the category name
-            print(color(cat["name"] + " ", conf, "purple", "ul"), end=" ")
-            # write the short version of the category name if present
-            if cat["short"]:
-                print(f"({color(cat['short'], conf, 'cyan')})")
-            else:
-                # add newline
-                print()
-            
-            # write out the items in the category
-            for id2, item in enumerate(cat["items"], 1):
-                # write the item ID
-                print(str(id1) + "." + str(id2) + " " * (longest_id - len(str(id1)) - 1 - len(str(id2))), end="  - ")
-                # write the item name
-                print(color(item["name"], conf, "white", "hi"), end=" ")
-                # indicate the presence of a link if exists
-                if item["link"]:
-                    print(color("[L]", conf, "black", "bold"), end=" ")
-                # add ':' before description
-                print(":", end=" ")
-                # write the description if it exists
-                print(item["desc"] if item["desc"] else "...")
-                
-                # if link is present, write it in a new line
-                if item["link"] and (conf["show links"] or args):
-                    print(" " * (longest_id + 5), "link:", color(item["link"], conf, "black", "bold"))
+    for n, (id1, cat) in enumerate(cats, 1):
+        print_cat(id1, cat, longest_id, conf)
+        
+        # write out the items in the category
+        for j in range(len(cat["items"])) if shown is None else shown_items[id1 - 1]:
+            print_item(id1, j + 1, cat["items"][j], longest_id, conf, conf["show links"] or args)
         
         # add newline between categories
-        if id1 != len(book) and not args:
+        if n != len(cats) and not args:
             print()
             
 
@@ -229,8 +335,123 @@ def lscat(book, conf):
         # write the short version of the category name if present, add newline (default `end` of print()s)
         if cat["short"]:
             print(f"({color(cat['short'], conf, 'cyan')})")
+    
+    # show the number of items with each tag, most used first
+    counts = collections.Counter(tag for cat in book for item in cat["items"] for tag in item.get("tags") or [])
+    if counts:
+        counts = sorted([(count, tag) for tag, count in counts.items()], key=lambda x: (-x[0], x[1]))
+        print("\nTags: " + ", ".join(f"{color(tag, conf, 'cyan')} ({count})" for count, tag in counts))
 
     
+def compile_query(expr, book):
+    """
+    Compile a query into a plan, returns (category predicates, item predicates)
+    Clauses are separated by spaces and can be negated with a leading '-' or '!':
+        cat:dev,2    items in any of the given categories (short names or IDs)
+        tag:python   items with the tag
+        has:link     items with a link (or 'desc' or 'tags')
+        name:text    items with the text in their name (or 'desc' or 'link'), case insensitive
+        name~regex   items whose name (or 'desc' or 'link') matches the regular expression
+        text         items with the text in their name or description, case insensitive, also when it has ':' or '~' after something other than the fields above
+    Category predicates are called as p(category index), item predicates as p(category index, item index, item) and sorted
+    so the cheap ones run first. Categories that don't pass all category predicates can be skipped entirely.
+    """
+    
+    try:
+        words = shlex.split(expr)
+    except ValueError as error:
+        exit(f"Invalid query: {error}.")
+    if not words:
+        exit("Query can't be empty.")
+    
+    cat_preds = []
+    item_preds = []  # (cost, predicate)
+    for word in words:
+        negate = word[:1] in ["-", "!"] and len(word) > 1
+        word = word[1:] if negate else word
+        field, op, value = word, "", ""
+        for n, char in enumerate(word):
+            if char in ":~":
+                field, op, value = word[:n], char, word[n + 1:]
+                break
+        
+        if field == "cat" and op == ":":
+            wanted = set()
+            for cat_n in value.split(","):
+                if find_cat(cat_n, book) is None:
+                    exit(f"Category '{cat_n}' doesn't exist.")
+                wanted.add(find_cat(cat_n, book))
+            cat_preds.append(lambda i, wanted=wanted, negate=negate: (i in wanted) != negate)
+        
+        elif field == "tag" and op == ":":
+            # checked on the item itself, so categories skipped by other clauses cost nothing
+            tags = set(parse_tags(value))
+            item_preds.append((1, lambda i, j, item, tags=tags, negate=negate: tags.issubset(item.get("tags") or ()) != negate))
+        
+        elif field == "has" and op == ":":
+            if value not in ["link", "desc", "tags"]:
+                exit(f"Unknown field '{value}', must be one of 'link', 'desc', 'tags'.")
+            item_preds.append((2, lambda i, j, item, key=value, negate=negate: bool(item.get(key)) != negate))
+        
+        elif field in ["name", "desc", "link"] and op == ":":
+            item_preds.append((3, lambda i, j, item, key=field, text=value.lower(), negate=negate: (text in (item[key] or "").lower()) != negate))
+        
+        elif field in ["name", "desc", "link"] and op == "~":
+            try:
+                regex = re.compile(value)
+            except re.error as error:
+                exit(f"Invalid regular expression '{value}': {error}.")
+            item_preds.append((4, lambda i, j, item, key=field, regex=regex, negate=negate: bool(item[key] and regex.search(item[key])) != negate))
+        
+        elif not op or field not in ["cat", "tag", "has", "name", "desc", "link"]:
+            # plain text, also when it only looks like a clause, e.g. 'http://example.com'
+            item_preds.append((3, lambda i, j, item, text=word.lower(), negate=negate: (text in (item["name"] + " " + (item["desc"] or "")).lower()) != negate))
+        
+        else:
+            exit(f"Unknown clause '{word}'.")
+    
+    # run the cheap clauses first
+    item_preds.sort(key=lambda x: x[0])
+    return cat_preds, [x[1] for x in item_preds]
+
+
+def query(args, book, conf):
+    """Show the items matching a query (see compile_query), in the same format as ls"""
+    
+    if not args:
+        args = input("Query: ")
+    cat_preds, item_preds = compile_query(args, book)
+    
+    # find the amount of characters the longest ID takes to display
+    longest_id = len(str(len(book))) + 1 + len(str(max([len(x["items"]) for x in book] + [0])))
+    
+    found = 0
+    for id1, cat in enumerate(book, 1):
+        if not all(x(id1 - 1) for x in cat_preds):
+            continue
+        
+        # print matches as they're found, along with the category before the first one
+        shown = False
+        for id2, item in enumerate(cat["items"], 1):
+            if not all(x(id1 - 1, id2 - 1, item) for x in item_preds):
+                continue
+            if not shown:
+                print("BOAR - Book Of All References" if not found else "")
+                print_cat(id1, cat, longest_id, conf)
+                shown = True
+            print_item(id1, id2, item, longest_id, conf, conf["show links"])
+            found += 1
+    
+    if not found:
+        print("No items found.")
+
+
+def valid_short(short):
+    """Check that a short name for a category is 2-8 alphanumeric characters and doesn't start with a number"""
+    
+    return short.isalnum() and not short[0].isnumeric() and 2 <= len(short) <= 8
+
+
 def addcat(args, book, conf):
     """Add a category to the book, returns a modified book (list)"""
     
@@ -262,7 +483,7 @@ def addcat(args, book, conf):
                 break  # all good
             short += str([x["short"][:len(short)] for x in book].count(short) + 1)  # find number of items with same name
             break
-        if not short.isalnum() or short[0].isnumeric() or not 2 <= len(short) <= 8:
+        if not valid_short(short):
             print("Short name must be composed of alphanumeric characters, can not start with a number and be 2-8 characters long.")
             continue
         if short not in [x["short"] for x in book]:
@@ -296,7 +517,8 @@ def add(args, book, conf):
         if not cat_n:
             exit()
     # check if category exists or if ID is valid
-    if cat_n not in [x["short"] for x in book] and not ( cat_n.isnumeric() and 0 < int(cat_n) <= len(book) ):
+    cat_i = find_cat(cat_n, book)
+    if cat_i is None:
         exit(f"Category with short name or ID of '{cat_n}' doesn't exist.")
     
     # get the name for the item
@@ -312,7 +534,7 @@ def add(args, book, conf):
     for i, cat in enumerate(book, 1):
         
         # if not the selected category, add it to new book unchanged
-        if cat_n not in [str(i), cat["short"]]:
+        if i - 1 != cat_i:
             mod_book.append(cat)
             continue
         
@@ -328,11 +550,17 @@ def add(args, book, conf):
         link = input("Item link (or leave blank): ")
         link = link if link else None
         
-        cat["items"].append({
+        # ask for tags for the item
+        tags = parse_tags(input("Item tags, separated by commas (or leave blank): "))
+        
+        item = {
             "name": name,
             "desc": desc,
             "link": link
-            })
+            }
+        if tags:
+            item["tags"] = tags
+        cat["items"].append(item)
         
         mod_book.append(cat)
     
@@ -349,14 +577,15 @@ def rmcat(args, book, conf):
     
     if not cat_n:
         exit("No category name provided.")
-    if cat_n not in [str(x) for x in range(1, len(book) + 1)] + [x["short"] for x in book]:
+    cat_i = find_cat(cat_n, book)
+    if cat_i is None:
         exit("Category doesn't exist.")
     
     mod_book = []
     for i, cat in enumerate(book, 1):
         
         # if not the specified category, add it to the new book
-        if cat_n not in [str(i), cat["short"]]:
+        if i - 1 != cat_i:
             mod_book.append(cat)
             continue
         
@@ -365,47 +594,210 @@ def rmcat(args, book, conf):
     return mod_book
 
 
-def rm(args, book, conf):
-    """Remove an entry from a category, returns a modified book (list)"""
+# stable ID -> (category index, item index or None), built by locate() when first needed
+id_index = {}
+
+
+def locate(stable_id, book):
+    """
+    Return (category index, item index) of the item with the given stable ID, (category index, None) if it's a category's, None if neither exists
+    The index of stable IDs is built on the first lookup, and rebuilt if the book has changed since.
+    """
     
-    if args:
-        if "." in args:
-            args = args.split(".", 1)
-        else:
-            args = args.split(" ")
-        cat_n = args.pop(0)  # category name
-        item_n = " ".join(args)
+    stable_id = stable_id.lstrip("@")
+    
+    def found(location):
+        if location is None or location[0] >= len(book):
+            return False
+        cat = book[location[0]]
+        if location[1] is None:
+            return cat.get("id") == stable_id
+        return location[1] < len(cat["items"]) and cat["items"][location[1]].get("id") == stable_id
+    
+    if not found(id_index.get(stable_id)):
+        id_index.clear()
+        for i, cat in enumerate(book):
+            id_index[cat.get("id")] = (i, None)
+            for j, item in enumerate(cat["items"]):
+                id_index[item.get("id")] = (i, j)
+        id_index.pop(None, None)
+    
+    return id_index.get(stable_id)
+
+
+def assign_ids(book):
+    """
+    Give a stable ID to every category and item that doesn't have one yet, returns whether any were added
+    IDs are made from the category short name and item name if possible, so the same entries get the same IDs in different copies of the book.
+    """
+    
+    taken = {x.get("id") for x in book} | {y.get("id") for x in book for y in x["items"]}
+    added = False
+    
+    def new_id(seed):
+        # on a clash rehash with a counter, so copies of the same book still get the same IDs
+        stable_id = content_hash(seed)[:8]
+        n = 0
+        while stable_id in taken:
+            n += 1
+            stable_id = content_hash(f"{seed}\0{n}")[:8]
+        taken.add(stable_id)
+        return stable_id
+    
+    for cat in book:
+        if not cat.get("id"):
+            cat["id"] = new_id("\0" + cat["short"])
+            added = True
+        for item in cat["items"]:
+            if not item.get("id"):
+                item["id"] = new_id(cat["short"] + "\0" + item["name"].lower())
+                added = True
+    return added
+
+
+def find_cat(cat_n, book):
+    """Return the index of a category by its short name, ID or stable ID (starting with '@'), None if it doesn't exist"""
+    
+    if cat_n.startswith("@"):
+        found = locate(cat_n, book)
+        return found[0] if found and found[1] is None else None
+    for i, cat in enumerate(book):
+        if cat_n in [str(i + 1), cat["short"]]:
+            return i
+    return None
+
+
+def find_item(item_n, cat):
+    """Return the index of an item in a category by its name, ID (case insensitive) or stable ID (starting with '@'), None if it doesn't exist"""
+    
+    if item_n.startswith("@"):
+        for j, item in enumerate(cat["items"]):
+            if item.get("id") == item_n[1:]:
+                return j
+        return None
+    item_n = item_n.lower()
+    for j, item in enumerate(cat["items"]):
+        if item_n in [str(j + 1), item["name"].lower()]:
+            return j
+    return None
+
+
+def resolve_selector(sel, book):
+    """
+    Resolve a single item selector into a list of (category index, item index) pairs, returns (pairs, error message)
+    sel: [str] 'cat.item' or 'cat item', where cat is a short name, ID or stable ID and item a name, ID or stable ID,
+        a stable ID of an item on its own ('@id'), a range like 'cat.1-40' or 'cat.1-cat.40', or 'cat.*' for all items in a category
+    """
+    
+    # an item by its stable ID
+    if sel.startswith("@") and "." not in sel and " " not in sel:
+        found = locate(sel, book)
+        if found is None:
+            return None, f"Nothing with the stable ID '{sel}' exists."
+        if found[1] is None:
+            return None, f"'{sel}' is a category, use '{sel}.*' to select all of its items."
+        return [found], None
+    
+    # split the selector to category and item
+    if "." in sel:
+        cat_n, item_n = sel.split(".", 1)
     else:
-        cat_n = input("Category to remove from (short) or ID: ")
-        item_n = ''
+        cat_n, _, item_n = sel.partition(" ")
+    cat_n, item_n = cat_n.strip(), item_n.strip()
+    
+    ci = find_cat(cat_n, book)
+    if ci is None:
+        return None, f"Category '{cat_n}' doesn't exist."
+    items = book[ci]["items"]
+    if not item_n:
+        return None, f"No item given for category '{cat_n}'."
+    
+    # all items in category
+    if item_n == "*":
+        return [(ci, j) for j in range(len(items))], None
+    
+    # a single item, names take precedence over ranges as they may contain a '-'
+    j = find_item(item_n, book[ci])
+    if j is not None:
+        return [(ci, j)], None
+    
+    # a range of items
+    start, is_range, end = item_n.partition("-")
+    if is_range:
+        if "." in end:
+            end_cat, end = end.split(".", 1)
+            if find_cat(end_cat.strip(), book) != ci:
+                return None, f"Range '{sel}' can't span multiple categories."
+        start, end = start.strip(), end.strip()
+        if start.isnumeric() and end.isnumeric():
+            if not 0 < int(start) <= int(end) <= len(items):
+                return None, f"Range '{sel}' is out of bounds."
+            return [(ci, j) for j in range(int(start) - 1, int(end))], None
+    
+    return None, f"Item '{item_n}' doesn't exist in category '{cat_n}'."
+
+
+def select_items(args, book, action):
+    """
+    Resolve a comma separated list of item selectors (see resolve_selector) into a list of (category index, item index) pairs.
+    Everything is resolved against the book as it is before any changes, so e.g. removing an item doesn't shift the IDs of the ones after it.
+    args: [str] selectors passed from the command line, prompted for if empty
+    action: [str] what is being done to the items, used in prompts
+    """
     
-    if not cat_n:
-        exit("No category name provided.")
-    if cat_n not in [str(x) for x in range(1, len(book) + 1)] + [x["short"] for x in book]:
-        exit("Category doesn't exist.")
+    # prompt for the category and item if not passed
+    if not args:
+        cat_n = input(f"Category of item to {action} (short) or ID: ")
+        if not cat_n:
+            exit("No category name provided.")
+        if find_cat(cat_n, book) is None:
+            exit("Category doesn't exist.")
+        item_n = input(f"Item name or ID to {action}: ")
+        args = cat_n + "." + item_n
+    
+    # try the whole string as one selector first, since item names can contain commas
+    selected, error = resolve_selector(args, book)
+    if selected is None:
+        selected = []
+        for sel in args.split(","):
+            if not sel.strip():
+                continue
+            pairs, error = resolve_selector(sel.strip(), book)
+            if pairs is None:
+                exit(error)
+            selected += pairs
+    
+    # remove duplicates, keeping the order
+    selected = list(dict.fromkeys(selected))
+    if not selected:
+        exit("No items selected.")
+    
+    return selected
+
+
+def rm(args, book, conf):
+    """Remove one or more entries, returns a modified book (list)"""
+    
+    selected = select_items(args, book, "remove")
+    
+    # group the items to remove by category
+    to_remove = {}
+    for ci, ii in selected:
+        to_remove.setdefault(ci, set()).add(ii)
     
     mod_book = []
-    for i, cat in enumerate(book, 1):
+    for i, cat in enumerate(book):
         
-        # if not the specified category, add it to the new book
-        if cat_n not in [str(i), cat["short"]]:
+        # if no items are removed from the category, add it to the new book
+        if i not in to_remove:
             mod_book.append(cat)
             continue
         
-        if not item_n:
-            item_n = input("Item name or ID to remove: ")
-        
-        item_n = item_n.lower()
-        
-        # check if item exists in category
-        if item_n not in [str(x) for x in range(1, len(cat["items"]) + 1)] + [x["name"].lower() for x in cat["items"]]:
-            exit("Item doesn't exist in category.")
-        
         mod_items = []
-        for j, item in enumerate(cat["items"], 1):
+        for j, item in enumerate(cat["items"]):
             
-            # if not the specified item, add it to the new items list
-            if item_n not in [str(j), item["name"].lower()]:
+            # if not a specified item, add it to the new items list
+            if j not in to_remove[i]:
                 mod_items.append(item)
                 continue
             
@@ -416,7 +808,6 @@ def rm(args, book, conf):
         mod_book.append(cat)
     
     return mod_book
-            
 
 
 def editcat(args, book, conf):
@@ -429,14 +820,15 @@ def editcat(args, book, conf):
     
     if not cat_n:
         exit("No category name provided.")
-    if cat_n not in [str(x) for x in range(1, len(book) + 1)] + [x["short"] for x in book]:
+    cat_i = find_cat(cat_n, book)
+    if cat_i is None:
         exit("Category doesn't exist.")
     
     mod_book = []
     for i, cat in enumerate(book, 1):
         
         # if not the specified category, add it to the new book
-        if cat_n not in [str(i), cat["short"]]:
+        if i - 1 != cat_i:
             mod_book.append(cat)
             continue
         
@@ -456,7 +848,7 @@ def editcat(args, book, conf):
         if new_short_n:
             # change short name
             
-            if not new_short_n.isalnum() or new_short_n[0].isnumeric() or not 2 <= len(new_short_n) <= 8:
+            if not valid_short(new_short_n):
                 print("Short name must be composed of alphanumeric characters, can not start with a number and be 2-8 characters long.")
             elif new_short_n in [x["short"] for x in book]:
                 print("Category with same short name already exists.")
@@ -474,95 +866,574 @@ def editcat(args, book, conf):
     return mod_book
 
 
+def shorten(text, length=20):
+    """Shorten text for printing changes, None is kept as is"""
+    
+    if not text or len(text) <= length:
+        return text
+    return text[:length - 3] + "..."
+
+
 def edit(args, book, conf):
-    """Edit an entry from a categoroy, returns a modified book (list)"""
+    """Edit one or more entries, returns a modified book (list)"""
     
-    if args:
-        if "." in args:
-            args = args.split(".", 1)
-        else:
-            args = args.split(" ")
-        cat_n = args.pop(0)  # category name
-        item_n = " ".join(args)
+    selected = select_items(args, book, "edit")
+    bulk = len(selected) > 1
+    
+    # names have to be unique within a category, so only ask for one when editing a single item
+    new_item_n = ""
+    if bulk:
+        print(f"Editing {len(selected)} items, the same description, link and tags will be set for all of them.")
+    else:
+        new_item_n = input("New name for item (blank to leave unchanged): ")
+        ci, ii = selected[0]
+        item = book[ci]["items"][ii]
+        if new_item_n.lower() in [x["name"].lower() for x in book[ci]["items"]] and new_item_n.lower() != item["name"].lower():
+            exit("Item with the same name already exists.")
+    new_item_desc = input(f"New description for item (blank to leave unchanged, '{conf['clear']}' to clear): ")
+    new_item_link = input(f"New link for item (blank to leave unchanged, '{conf['clear']}' to clear): ")
+    new_item_tags = input(f"New tags for item, separated by commas (blank to leave unchanged, '{conf['clear']}' to clear, +tag or -tag to add or remove one): ")
+    
+    # find out whether to replace the tags or add and remove single tags
+    add_tags, remove_tags = [], []
+    if new_item_tags.lower() == conf["clear"].lower():
+        new_item_tags = []
+    elif new_item_tags and all(x.strip()[:1] in "+-" for x in new_item_tags.split(",") if x.strip()):
+        add_tags = parse_tags(",".join(x.strip()[1:] for x in new_item_tags.split(",") if x.strip().startswith("+")))
+        remove_tags = parse_tags(",".join(x.strip()[1:] for x in new_item_tags.split(",") if x.strip().startswith("-")))
+        new_item_tags = None
+    elif new_item_tags:
+        new_item_tags = parse_tags(new_item_tags)
     else:
-        cat_n = input("Category of entry to edit (short) or ID: ")
-        item_n = ''
+        new_item_tags = None
     
-    if not cat_n:
-        exit("No category name provided.")
-    if cat_n not in [str(x) for x in range(1, len(book) + 1)] + [x["short"] for x in book]:
-        exit("Category doesn't exist.")
+    # store old and new values to print changes later
+    changed = []
     
-    mod_book = []
-    for i, cat in enumerate(book, 1):
+    mod_book = book.copy()
+    for ci, ii in selected:
+        item = mod_book[ci]["items"][ii]
+        prefix = item["name"] + ": " if bulk else ""  # tell apart changes of different items
         
-        # if not the specified category, add it to the new book
-        if cat_n not in [str(i), cat["short"]]:
-            mod_book.append(cat)
+        # change item name
+        if new_item_n:
+            changed.append(f"{color(item['name'], conf, 'red')} -> {color(new_item_n, conf, 'green')}")  # store change
+            item["name"] = new_item_n
+        
+        # change item description and link
+        for key, new_value in [("desc", new_item_desc), ("link", new_item_link)]:
+            if new_value.lower() == conf["clear"].lower():  # clear value
+                new_value = None
+            elif not new_value:  # leave unchanged
+                continue
+            if new_value == item[key]:
+                continue
+            changed.append(prefix + f"{color(str(shorten(item[key])), conf, 'red')} -> {color(str(shorten(new_value)), conf, 'green')}")  # store change
+            item[key] = new_value
+        
+        # change item tags
+        old_tags = item.get("tags") or []
+        tags = new_item_tags if new_item_tags is not None else old_tags
+        tags = [x for x in tags if x not in remove_tags] + [x for x in add_tags if x not in tags]
+        if tags != old_tags:
+            changed.append(prefix + f"{color(', '.join(old_tags) or 'None', conf, 'red')} -> {color(', '.join(tags) or 'None', conf, 'green')}")  # store change
+            if tags:
+                item["tags"] = tags
+            else:
+                item.pop("tags", None)
+    
+    if not changed:
+        print(color("No changes made", conf, "yellow"))
+        exit()
+    print("Changes:\n" + "\n".join(changed))  # print changes
+    
+    return mod_book
+
+
+def escape_field(text):
+    """Escape a value for the editor format, where fields are separated by '|' and each entry is on its own line"""
+    
+    return (text or "").replace("\\", "\\\\").replace("|", "\\|").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def split_fields(line, separator="|"):
+    """Split a line in the editor format by unescaped separators ('|', None to not split), returns the stripped and unescaped fields"""
+    
+    fields = [""]
+    escaped = False
+    for char in line:
+        if escaped:
+            fields[-1] += {"n": "\n", "r": "\r"}.get(char, char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == separator:
+            fields.append("")
+        else:
+            fields[-1] += char
+    return [x.strip() for x in fields]
+
+
+def dump_for_editor(book, indexes):
+    """Write the categories with the given indexes in a line based format for editing them in a text editor, returns the text"""
+    
+    lines = [
+        "# Edit the categories and items below, lines starting with '#' and empty lines are ignored.",
+        "# Categories are written as '== ID short : name', items under them as 'ID | name | description | link | tags'.",
+        "# Leave out the ID to add a new category or item, delete the line to remove it, move it under another category to move it.",
+        "# Keep the IDs of existing categories and items unchanged, they're used to find what has changed.",
+        "",
+    ]
+    for i in indexes:
+        cat = book[i]
+        lines.append(f"== {i + 1} {cat['short']} : {escape_field(cat['name'])}")
+        for j, item in enumerate(cat["items"], 1):
+            fields = [f"{i + 1}.{j}", item["name"], item["desc"], item["link"], ", ".join(item.get("tags") or [])]
+            lines.append(" | ".join(escape_field(x) for x in fields))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def parse_editor_text(text, book, indexes, file):
+    """
+    Parse text written by dump_for_editor after it has been edited, returns a list of categories as (category index or None, short, name, items),
+    where items is a list of (category index, item index) or None, name, description, link, tags
+    Exits with the line number if something can't be understood, mentioning the file where the edits are kept.
+    """
+    
+    def error(n, message):
+        exit(f"Line {n}: {message}\nYour edits are kept in '{file}', nothing has been changed.")
+    
+    cats = []
+    seen = set()
+    for n, line in enumerate(text.splitlines(), 1):
+        if not line.strip() or line.startswith("#"):
             continue
         
-        if not item_n:
-            item_n = input("Item name or ID to edit: ")
+        # a category
+        if line.startswith("=="):
+            head, colon, name = line[2:].partition(":")
+            head = head.split()
+            if not colon or not name.strip() or len(head) not in [1, 2]:
+                error(n, "Categories must be written as '== ID short : name'.")
+            cat_i = None
+            if len(head) == 2:
+                if not head[0].isnumeric() or int(head[0]) - 1 not in indexes:
+                    error(n, f"There's no category with the ID '{head[0]}' to edit.")
+                cat_i = int(head[0]) - 1
+                if cat_i in seen:
+                    error(n, f"Category with the ID '{head[0]}' is listed more than once.")
+                seen.add(cat_i)
+            cats.append((cat_i, head[-1].lower(), split_fields(name, None)[0], []))
+            continue
         
-        item_n = item_n.lower()
+        # an item
+        fields = split_fields(line)
+        if len(fields) != 5:
+            error(n, "Items must be written as 'ID | name | description | link | tags'.")
+        if not cats:
+            error(n, "Items must be under a category.")
+        item_id, name, desc, link, tags = fields
+        pos = None
+        if item_id:
+            cat_n, _, item_n = item_id.partition(".")
+            if not (cat_n.isnumeric() and item_n.isnumeric() and int(cat_n) - 1 in indexes and 0 < int(item_n) <= len(book[int(cat_n) - 1]["items"])):
+                error(n, f"There's no item with the ID '{item_id}' to edit.")
+            pos = (int(cat_n) - 1, int(item_n) - 1)
+            if pos in seen:
+                error(n, f"Item with the ID '{item_id}' is listed more than once.")
+            seen.add(pos)
+        if not name:
+            error(n, "Name can't be blank.")
+        tags = [x.strip().lower() for x in tags.split(",") if x.strip()]
+        for tag in tags:
+            if not valid_tag(tag):
+                error(n, f"Tag '{tag}' must be composed of alphanumeric characters, '-' and '_'.")
+        cats[-1][3].append((pos, name, desc or None, link or None, list(dict.fromkeys(tags))))
+    
+    # check the same rules as addcat, add and editcat
+    shorts = {x["short"] for i, x in enumerate(book) if i not in indexes}
+    names = {x["name"].lower() for i, x in enumerate(book) if i not in indexes}
+    for cat_i, short, name, items in cats:
+        if not valid_short(short):
+            exit(f"Short name '{short}' must be composed of alphanumeric characters, can not start with a number and be 2-8 characters long.\nYour edits are kept in '{file}', nothing has been changed.")
+        if short in shorts:
+            exit(f"Category with the short name '{short}' already exists.\nYour edits are kept in '{file}', nothing has been changed.")
+        if name.lower() in names:
+            exit(f"Category with the name '{name}' already exists.\nYour edits are kept in '{file}', nothing has been changed.")
+        shorts.add(short)
+        names.add(name.lower())
+        item_names = collections.Counter(x[1].lower() for x in items)
+        for item_name, count in item_names.items():
+            if count > 1:
+                exit(f"Item with the name '{item_name}' is listed more than once in category '{name}'.\nYour edits are kept in '{file}', nothing has been changed.")
+    
+    return cats
+
+
+def edit_in_editor(args, book, conf):
+    """Edit whole categories in the text editor set in $VISUAL or $EDITOR, returns a modified book (list)"""
+    
+    # select the category to edit, or all of them
+    if args:
+        cat_i = find_cat(args, book)
+        if cat_i is None:
+            exit("Category doesn't exist.")
+        indexes = [cat_i]
+    else:
+        indexes = list(range(len(book)))
+    
+    # write the categories to a temporary file and open it in the editor
+    text = dump_for_editor(book, indexes)
+    with tempfile.NamedTemporaryFile("w", prefix="boar-", suffix=".txt", delete=False) as file:
+        file.write(text)
+    editor = os.environ.get("VISUAL") or os.environ.get("EDITOR") or "vi"
+    if subprocess.call(shlex.split(editor) + [file.name]) != 0:
+        os.remove(file.name)
+        exit("The editor exited with an error, nothing has been changed.")
+    with open(file.name) as edited_file:
+        edited = edited_file.read()
+    if edited == text:
+        os.remove(file.name)
+        print(color("No changes made", conf, "yellow"))
+        exit()
+    cats = parse_editor_text(edited, book, indexes, file.name)
+    
+    # store the changes to print them later
+    changed = []
+    
+    # build the edited categories
+    new_cats = []
+    kept = {pos for _, _, _, items in cats for pos, *_ in items if pos}
+    for cat_i, short, name, items in cats:
+        if cat_i is None:
+            changed.append(color(f"+ {name} ({short})", conf, "green"))
+            cat = {"name": name, "short": short, "items": []}
+        else:
+            cat = dict(book[cat_i])
+            if name != cat["name"].strip():
+                changed.append(f"{color(cat['name'], conf, 'red')} -> {color(name, conf, 'green')}")
+            if short != cat["short"]:
+                changed.append(f"{color(cat['short'], conf, 'red')} -> {color(short, conf, 'green')}")
+            cat["name"], cat["short"] = name, short
         
-        # check if item exists in category
-        if item_n not in [str(x) for x in range(1, len(cat["items"]) + 1)] + [x["name"].lower() for x in cat["items"]]:
-            exit("Item doesn't exist in category.")
+        cat["items"] = []
+        for pos, item_name, desc, link, tags in items:
+            if pos is None:
+                changed.append(color(f"+ {name} / {item_name}", conf, "green"))
+                item = {"name": item_name, "desc": desc, "link": link}
+            else:
+                old_cat = book[pos[0]]
+                item = dict(old_cat["items"][pos[1]])
+                label = f"{name} / {item['name']}"
+                if pos[0] != cat_i:
+                    changed.append(f"{label}: {color(old_cat['name'], conf, 'red')} -> {color(name, conf, 'green')}")
+                if item_name != item["name"].strip():
+                    changed.append(f"{name} / {color(item['name'], conf, 'red')} -> {color(item_name, conf, 'green')}")
+                for key, value in [("desc", desc), ("link", link)]:
+                    # values are stripped in the file, don't count that as a change
+                    if value != (item[key].strip() if item[key] else None):
+                        changed.append(f"{label}: {color(str(shorten(item[key])), conf, 'red')} -> {color(str(shorten(value)), conf, 'green')}")
+                        item[key] = value
+                if tags != (item.get("tags") or []):
+                    changed.append(f"{label}: {color(', '.join(item.get('tags') or []) or 'None', conf, 'red')} -> {color(', '.join(tags) or 'None', conf, 'green')}")
+                item["name"] = item_name
+            item.pop("tags", None)
+            if tags:
+                item["tags"] = tags
+            cat["items"].append(item)
         
-        mod_items = []
-        for j, item in enumerate(cat["items"], 1):
-            
-            # if not the specified item, add it to the new items list
-            if item_n not in [str(j), item["name"].lower()]:
-                mod_items.append(item)
-                continue
-            
-            # store old and new values to print changes later
-            changed = []
-            
-            # change item name
-            new_item_n = input("New name for item (blank to leave unchanged): ")
-            if new_item_n:
-                if new_item_n.lower() in [x["name"].lower() for x in cat["items"]] and new_item_n.lower() != item["name"].lower():
-                    exit("Item with the same name already exists.")
-                changed.append(f"{color(item['name'], conf, 'red')} -> {color(new_item_n, conf, 'green')}")  # store change
-                item["name"] = new_item_n
-            
-            # change item description
-            new_item_desc = input(f"New description for item (blank to leave unchanged, '{conf['clear']}' to clear): ")
-            first_part = item["desc"] if item["desc"] and len(item["desc"]) <= 20 else item["desc"] if not item["desc"] else item["desc"][:17] + "..."  # old value for printing changes
-            if new_item_desc.lower() == conf["clear"].lower():  # clear description
-                changed.append(f"{color(first_part, conf, 'red')} -> {color('None', conf, 'green')}")  # store change
-                item["desc"] = None
-            elif new_item_desc:  # change description
-                sec_part = new_item_desc if len(new_item_desc) <= 20 else new_item_desc[:17] + "..."  # new value for printing changes
-                changed.append(f"{color(first_part, conf, 'red')} -> {color(sec_part, conf, 'green')}")  # store change
-                item["desc"] = new_item_desc
-            
-            # change item link
-            new_item_link = input(f"New link for item (blank to leave unchanged, '{conf['clear']}' to clear): ")
-            first_part = item["link"] if item["link"] and len(item["link"]) <= 20 else item["link"] if not item["link"] else item["link"][:17] + "..."  # old value for printing changes
-            if new_item_link.lower() == conf["clear"].lower():  # clear link
-                changed.append(f"{color(first_part, conf, 'red')} -> {color('None', conf, 'green')}")  # store change
-                item["link"] = None
-            elif new_item_link:  # change link
-                sec_part = new_item_link if len(new_item_link) <= 20 else new_item_link[:17] + "..."  # new value for printing changes
-                changed.append(f"{color(first_part, conf, 'red')} -> {color(sec_part, conf, 'green')}")  # store change
-                item["link"] = new_item_link
-            
-            mod_items.append(item)  # add item in changed form to the new items list
-            
-        # add modified item list to category
-        cat["items"] = mod_items
-        mod_book.append(cat)
+        # note items that stayed in the category but changed places
+        if cat_i is not None:
+            old_order = [j for j in range(len(book[cat_i]["items"])) if (cat_i, j) in kept]
+            new_order = [pos[1] for pos, *_ in items if pos and pos[0] == cat_i]
+            stayed = set(new_order)
+            if [x for x in old_order if x in stayed] != new_order:
+                changed.append(f"{name}: items reordered")
+        new_cats.append(cat)
+    
+    # removed categories and items
+    edited = {x[0] for x in cats}
+    for i in indexes:
+        removed = [x for j, x in enumerate(book[i]["items"]) if (i, j) not in kept]
+        if i not in edited:
+            changed.append(color(f"- {book[i]['name']} ({book[i]['short']}) with {len(removed)} items", conf, "red"))
+            continue
+        for item in removed:
+            changed.append(color(f"- {book[i]['name']} / {item['name']}", conf, "red"))
     
+    os.remove(file.name)
     if not changed:
         print(color("No changes made", conf, "yellow"))
         exit()
-    print("Changes:\n" + "\n".join(changed))  # print changes
+    print("Changes:\n" + "\n".join(changed))
+    prompt("Apply changes?")
     
-    return mod_book
+    # put the edited categories in place of the ones that were selected
+    start = indexes[0] if indexes else len(book)
+    return book[:start] + new_cats + [x for i, x in enumerate(book[start:], start) if i not in indexes]
+
+
+class Compact(collections.abc.MutableMapping):
+    """
+    Base for storing book entries in __slots__ instead of dicts, to keep large books small in memory.
+    Entries are mappings like the dicts they replace (entry["name"], entry.get("tags"), dict(entry) etc), so the same functions work on both.
+    The keys present are kept in their order in 'order', a tuple shared by all entries with the same keys, unknown keys are kept in 'extra'.
+    """
+    
+    __slots__ = ("order", "extra")
+    _keys = ()
+    _orders = {}  # tuple of keys -> the same tuple, to share them between entries
+    
+    def __init__(self, data):
+        self.order = ()
+        self.extra = None
+        for key, value in data.items():
+            self[key] = value
+    
+    def _set_order(self, order):
+        self.order = Compact._orders.setdefault(order, order)
+    
+    def __getitem__(self, key):
+        if key not in self.order:
+            raise KeyError(key)
+        if key in self._keys:
+            return getattr(self, key)
+        return self.extra[key]
+    
+    def __setitem__(self, key, value):
+        if key in self._keys:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+        if key not in self.order:
+            self._set_order(self.order + (key,))
+    
+    def __delitem__(self, key):
+        if key not in self.order:
+            raise KeyError(key)
+        if key in self._keys:
+            setattr(self, key, None)
+        else:
+            del self.extra[key]
+            self.extra = self.extra or None
+        self._set_order(tuple(x for x in self.order if x != key))
+    
+    def __contains__(self, key):
+        return key in self.order
+    
+    def __iter__(self):
+        return iter(self.order)
+    
+    def __len__(self):
+        return len(self.order)
+    
+    def get(self, key, default=None):
+        return self[key] if key in self.order else default
+    
+    def to_dict(self):
+        """Convert the entry back to the dict it was created from, with the keys in the same order"""
+        
+        return {x: self[x] for x in self.order}
+
+
+class Item(Compact):
+    """An item in the book, the scheme and host of links are interned to share them between items"""
+    
+    __slots__ = ("name", "desc", "host", "rest", "tags", "id")
+    _keys = ("name", "desc", "link", "tags", "id")
+    
+    @property
+    def link(self):
+        if self.rest is None:
+            return None
+        return self.host + self.rest
+    
+    @link.setter
+    def link(self, link):
+        # split 'https://example.com/path' to 'https://example.com' and '/path'
+        host_end = len(link) if link else 0
+        if link and "://" in link:
+            host_end = link.find("/", link.index("://") + 3)
+            host_end = len(link) if host_end == -1 else host_end
+        self.host = sys.intern(link[:host_end]) if link else ""
+        self.rest = link[host_end:] if link is not None else None
+    
+    def __setitem__(self, key, value):
+        if key == "tags" and value is not None:
+            value = [sys.intern(x) for x in value]
+        super().__setitem__(key, value)
+
+
+class Category(Compact):
+    """A category in the book, items are stored as Item objects"""
+    
+    __slots__ = ("name", "short", "items", "id")
+    _keys = ("name", "short", "items", "id")
+    
+    def __setitem__(self, key, value):
+        if key == "items":
+            value = [x if isinstance(x, Item) else Item(x) for x in value]
+        elif key == "short" and value is not None:
+            value = sys.intern(value)
+        super().__setitem__(key, value)
+
+
+def compact_hook(data):
+    """Object hook for json.load to create Category and Item objects while loading, so the dicts never all exist at once"""
+    
+    if "items" in data and "short" in data:
+        return Category(data)
+    if "name" in data and "link" in data:
+        return Item(data)
+    return data
+
+
+def plain(entry):
+    """Convert a Category or Item to a dict, for passing to json.dump as default"""
+    
+    if isinstance(entry, Compact):
+        return entry.to_dict()
+    raise TypeError(f"Object of type {type(entry).__name__} is not JSON serializable")
+
+
+def content_hash(data):
+    """Return a short hex digest of a string or bytes"""
+    
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def book_hashes(book):
+    """
+    Hash the book as a two level Merkle tree, returns (root hash, list of category hashes)
+    Each category is hashed from its JSON, the root from the category hashes, so two books with the same root are the same
+    and differing categories can be found without looking at their items.
+    """
+    
+    cat_hashes = [content_hash(json.dumps(cat, default=plain)) for cat in book]
+    return content_hash("".join(cat_hashes)), cat_hashes
+
+
+def detect_compression(data):
+    """Return the compression of file contents from their first bytes, one of 'none', 'gzip', 'lzma', 'zlib'"""
+    
+    if data[:2] == b"\x1f\x8b":
+        return "gzip"
+    if data[:6] == b"\xfd7zXZ\x00":
+        return "lzma"
+    if len(data) >= 2 and data[0] == 0x78 and (data[0] * 256 + data[1]) % 31 == 0:
+        return "zlib"
+    return "none"  # JSON starts with '[', '{' or whitespace, which none of the above do
+
+
+def compress(data, compression):
+    """Compress bytes with the given compression, one of 'none', 'gzip', 'lzma', 'zlib'"""
+    
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if compression == "lzma":
+        return lzma.compress(data)
+    if compression == "zlib":
+        return zlib.compress(data)
+    return data
+
+
+def decompress(data):
+    """Decompress bytes, detecting the compression from the header"""
+    
+    compression = detect_compression(data)
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "lzma":
+        return lzma.decompress(data)
+    if compression == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+def load_json(file):
+    """Load a book, tome or other JSON file that may be compressed"""
+    
+    with open(file, "rb") as json_file:
+        return json.loads(decompress(json_file.read()))
+
+
+# errors that can be raised when loading a broken file with load_json
+DECODE_ERRORS = (ValueError, EOFError, zlib.error, lzma.LZMAError, gzip.BadGzipFile)
+
+
+def write_book(path, book, compression="none"):
+    """Write the book to the book file along with a cache of its hashes (see cached_hashes) and the completion index"""
+    
+    # serialize categories one by one to hash them on the way, joined they're the same as json.dump(book)
+    parts = [json.dumps(cat, default=plain).encode() for cat in book]
+    with open(path + "book", "wb") as file:
+        file.write(compress(b"[" + b", ".join(parts) + b"]", compression))
+    
+    # store where each category is in the (uncompressed) file, to be able to load only some of them
+    offsets = []
+    start = 1
+    for part in parts:
+        offsets.append([start, start + len(part)])
+        start += len(part) + 2
+    
+    cat_hashes = [content_hash(x) for x in parts]
+    with open(path + "hashes", "w") as file:
+        json.dump({"stamp": file_stamp(path + "book"), "root": content_hash("".join(cat_hashes)), "cats": cat_hashes, "offsets": offsets}, file)
+    
+    write_completions(path, book)
+
+
+def file_stamp(file):
+    """Return the modification time and size of a file, used to tell if cached hashes of it are stale"""
+    
+    stat = os.stat(file)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def cached_hashes(path):
+    """
+    Return the cached hashes of the book in the data directory at path if the cache is up to date, None otherwise
+    The hashes are a dict with the keys 'root', 'cats' (see book_hashes) and 'offsets' ([start, end] of each category in the file)
+    """
+    
+    try:
+        with open(path + "hashes") as file:
+            hashes = json.load(file)
+        if hashes["stamp"] == file_stamp(path + "book"):
+            return hashes
+    except (FileNotFoundError, json.decoder.JSONDecodeError, KeyError, TypeError):
+        pass
+    return None
+
+
+def load_cats(file, hashes, wanted):
+    """Load only the categories with the given indexes from a book or tome file, using the offsets in its hashes, returns a dict of index -> category"""
+    
+    if not hashes.get("offsets"):
+        book = load_json(file)
+        return {x: book[x] for x in wanted}
+    
+    cats = {}
+    with open(file, "rb") as book_file:
+        # compressed files have to be decompressed as a whole, but only the wanted categories are parsed
+        head = book_file.read(6)
+        if detect_compression(head) != "none":
+            data = decompress(head + book_file.read())
+            for i in wanted:
+                start, end = hashes["offsets"][i]
+                cats[i] = json.loads(data[start:end])
+            return cats
+        
+        for i in sorted(wanted):
+            start, end = hashes["offsets"][i]
+            book_file.seek(start)
+            cats[i] = json.loads(book_file.read(end - start))
+    return cats
 
 
 def save_book(path, book_edited, book, conf):
@@ -571,60 +1442,757 @@ def save_book(path, book_edited, book, conf):
     # save the old version to history
     save_to_history(path, book, conf)
     
-    # write the current version to the book file
-    with open(path + "book", "w") as file:
-        json.dump(book_edited, file)
+    # give new categories and items their stable IDs and write the current version to the book file
+    assign_ids(book_edited)
+    write_book(path, book_edited, conf.get("compression", "none"))
 
 
 def save_to_history(path, book, conf):
-    """Save the given book to a new entry in history as a 'tome' and overwrite old versions as specified in conf. tome1 is the latest tome, tome2 second oldest etc."""
-    
-    # increment the number of all tomes
-    all_files = os.listdir(path + "history")
-    for tome in sorted([x for x in all_files if x.startswith("tome")], reverse=True):
-        tome_num = int(tome[4:])
-        if tome_num < conf["history length"]:
-            os.rename(path + "history/" + tome, path + "history/tome" + str(tome_num + 1))
-    # add a new tome with number 1 to history
-    if conf["history length"]:
-        with open(path + "book") as book_file:
-            book = json.load(book_file)
-            with open(path + "history/tome1", "w") as file:
-                json.dump(book, file)
-
-
-def undo(path, times=1):
-    """Write a tome to book, decrement tome numbers appropriately."""
-    
-    if not times:
-        times = 1
-
-    # check that times is a number
-    if not str(times).isnumeric() or not int(times):
-        exit("The number of times to undo must be a positive integer.")
-    times = int(times)
-    
-    # write correct tome to book
+    """
+    Save the current book file to history as a 'tome' named after the time it was saved, and delete the tomes that are no longer kept (see prune_history)
+    Existing tomes are never renamed, the order of tomes is kept in history/manifest (see load_manifest) and their hashes next to them (see tome_hashes)
+    """
+    
+    if not conf["history length"]:
+        return
+    manifest = load_manifest(path)
+    
+    hashes = cached_hashes(path)
+    with open(path + "book", "rb") as book_file:
+        data = book_file.read()
+    # recompress the book if it's not compressed as configured, without parsing it
+    if detect_compression(data) != conf.get("compression", "none"):
+        data = compress(decompress(data), conf.get("compression", "none"))
+    now = time.time()
+    entry = {"file": tome_name(now), "time": now, "size": len(data)}
+    with open(path + "history/" + entry["file"], "wb") as file:
+        file.write(data)
+    
+    # the tome is a copy of the book, so it has the same hashes
+    if hashes:
+        entry["root"], entry["categories"] = hashes["root"], len(hashes["cats"])
+        save_tome_hashes(path, entry["file"], hashes)
+    manifest["tomes"].append(entry)
+    
+    # only the expired tomes are touched, the rest stay as they are
+    for tome in prune_history(manifest, now, conf):
+        for file in [tome["file"], tome["file"] + ".hashes"]:
+            try:
+                os.remove(path + "history/" + file)
+            except FileNotFoundError:
+                pass
+    save_manifest(path, manifest)
+
+
+def tome_name(moment):
+    """Return the file name of a tome saved at the given time (seconds since epoch), e.g. 'tome-20241019T153012.123456Z'"""
+    
+    return "tome-" + datetime.datetime.fromtimestamp(moment, datetime.timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+
+
+def load_manifest(path, save=True):
+    """
+    Return the manifest of history, a dict with the keys
+        'tomes': [list] the tomes in history, oldest first, each a dict with the keys 'file' (its name in history), 'time' (when it was saved, seconds since epoch),
+                 'size' (bytes), and 'root' and 'categories' (the root hash and number of categories) if its hashes are known
+        'retention', 'starts', 'arrived': where prune_history left off, missing if it hasn't been run with the current tomes
+    When there's no manifest, it's made from the tomes found in history, renaming tomes numbered by an older version of boar (tome1, tome2...) after their time.
+    save: [bool] whether to write the manifest and rename old tomes if one had to be made
+    """
+    
     try:
-        with open(path + "history/tome" + str(times)) as tome_file:
-            ancient_texts = json.load(tome_file)
-            with open(path + "book", "w") as book_file:
-                json.dump(ancient_texts, book_file)
-    except json.decoder.JSONDecodeError:
-        exit(f"The ancient texts in tome{times} seem untranslateable.")
+        with open(path + "history/manifest") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        pass
+    
+    tomes = []
+    renames = []
+    for tome in os.listdir(path + "history"):
+        if tome.startswith("tome-") and not tome.endswith(".hashes"):
+            try:
+                moment = datetime.datetime.strptime(tome, "tome-%Y%m%dT%H%M%S.%fZ").replace(tzinfo=datetime.timezone.utc).timestamp()
+            except ValueError:
+                continue
+            entry = {"file": tome, "time": moment}
+        elif tome.startswith("tome") and tome[4:].isnumeric():
+            # tomes were written when saving and only renamed since, so their modification time is when they were saved
+            entry = {"file": tome, "time": os.path.getmtime(path + "history/" + tome)}
+            renames.append(entry)
+        else:
+            continue
+        entry["size"] = os.path.getsize(path + "history/" + tome)
+        tomes.append(entry)
+    tomes.sort(key=lambda x: x["time"])
+    
+    manifest = {"tomes": tomes}
+    if save:
+        for entry in renames:
+            os.rename(path + "history/" + entry["file"], path + "history/" + tome_name(entry["time"]))
+            entry["file"] = tome_name(entry["time"])
+        save_manifest(path, manifest)
+    return manifest
+
+
+def save_manifest(path, manifest):
+    """Write the manifest of history (see load_manifest), replacing the old manifest at once so it's never left half written"""
+    
+    with open(path + "history/manifest.tmp", "w") as file:
+        json.dump(manifest, file)
+    os.replace(path + "history/manifest.tmp", path + "history/manifest")
+
+
+def parse_duration(text):
+    """Return the number of seconds in a duration like '90s', '30m', '2h', '7d' or '4w', None if it isn't one"""
+    
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+    match = re.fullmatch(r"(\d+)\s*([smhdw])", text.strip().lower())
+    if not match:
+        return None
+    return int(match[1]) * units[match[2]]
+
+
+def parse_retention(text):
+    """
+    Parse history retention tiers like '1h:all,1d:1h,30d:1d' (keep every version for an hour, one per hour for a day, one per day for 30 days)
+    Returns a list of (max age, interval) in seconds, interval 0 meaning every version and max age None meaning forever,
+    or None if the text is invalid or the max ages aren't increasing
+    """
+    
+    tiers = []
+    for tier in text.split(","):
+        if tier.count(":") != 1:
+            return None
+        age, interval = [x.strip().lower() for x in tier.split(":")]
+        max_age = None if age == "forever" else parse_duration(age)
+        interval = 0 if interval == "all" else parse_duration(interval)
+        if (max_age is None and age != "forever") or interval is None:
+            return None
+        if tiers and (tiers[-1][0] is None or max_age is not None and max_age <= tiers[-1][0]):
+            return None
+        tiers.append((max_age, interval))
+    return tiers
+
+
+def prune_history(manifest, now, conf):
+    """
+    Remove the tomes that are no longer kept from the manifest, returns the removed tomes
+    The latest 'history length' tomes are always kept. Older ones are kept according to the tier of 'history retention' their age fits in (see parse_retention),
+    which keeps the latest tome of each of its intervals, and tomes older than all the tiers are removed.
+    Tomes are in order of age, so the tomes of each tier are next to each other and 'starts' keeps the index of the oldest tome in each tier.
+    Only the tomes that got too old for their tier since the last save, and the one that stopped being one of the latest, are looked at:
+    a tome moving to a tier replaces the previous tome there if they're in the same interval.
+    """
+    
+    retention = conf.get("history retention", RETENTION)
+    tiers = parse_retention(retention) or [(0, 0)]
+    tomes = manifest["tomes"]
+    if manifest.get("retention") != retention or len(manifest.get("starts", [])) != len(tiers):
+        return rebuild_history(manifest, now, conf, retention, tiers)
+    starts = manifest["starts"]
+    removed = []
+    
+    def remove(n):
+        removed.append(tomes.pop(n))
+        for k in range(len(starts)):
+            if starts[k] > n:
+                starts[k] -= 1
+        if manifest["arrived"] > n:
+            manifest["arrived"] -= 1
+    
+    def replace_previous(n, k):
+        # keep only the latest tome of each interval in a tier, tomes of tier k are from starts[k] up to the start of the next younger tier
+        interval = tiers[k][1]
+        if interval and n - 1 >= starts[k] and tomes[n - 1]["time"] // interval == tomes[n]["time"] // interval:
+            remove(n - 1)
+    
+    # tomes that stopped being one of the latest arrive in the tier they're in
+    manifest["arrived"] = min(manifest["arrived"], max(len(tomes) - conf["history length"], 0))
+    while manifest["arrived"] < len(tomes) - conf["history length"]:
+        n = manifest["arrived"]
+        manifest["arrived"] += 1
+        replace_previous(n, min(k for k in range(len(tiers)) if starts[k] <= n))
+    
+    # move the oldest tomes of each tier to the next one while they're too old for it, starting from the youngest tier
+    for k, (max_age, _) in enumerate(tiers):
+        while max_age is not None and starts[k] < manifest["arrived"] and now - tomes[starts[k]]["time"] >= max_age:
+            starts[k] += 1
+            if k == len(tiers) - 1:
+                remove(starts[k] - 1)
+            else:
+                replace_previous(starts[k] - 1, k + 1)
+    return removed
+
+
+def rebuild_history(manifest, now, conf, retention, tiers):
+    """Remove the tomes that aren't kept going through all of them, and set where prune_history continues from, used when the tiers have changed (see prune_history)"""
+    
+    tomes = manifest["tomes"]
+    # the latest tomes are kept without taking up the interval they're in, as they haven't arrived in any tier yet
+    arrived = max(len(tomes) - conf["history length"], 0)
+    kept = set(range(arrived, len(tomes)))
+    intervals = set()
+    for n in range(arrived - 1, -1, -1):
+        age = now - tomes[n]["time"]
+        for k, (max_age, interval) in enumerate(tiers):
+            if max_age is None or age < max_age:
+                if not interval:
+                    kept.add(n)
+                elif (k, tomes[n]["time"] // interval) not in intervals:
+                    intervals.add((k, tomes[n]["time"] // interval))
+                    kept.add(n)
+                break
+    removed = [x for n, x in enumerate(tomes) if n not in kept]
+    tomes[:] = [x for n, x in enumerate(tomes) if n in kept]
+    
+    # the oldest tome of each tier is the first one younger than its max age
+    arrived -= len(removed)
+    times = [x["time"] for x in tomes[:arrived]]
+    starts = [bisect.bisect_right(times, now - max_age) if max_age is not None else 0 for max_age, _ in tiers]
+    manifest.update(retention=retention, starts=starts, arrived=arrived)
+    return removed
+
+
+def save_tome_hashes(path, tome, hashes):
+    """Write the category hashes and offsets of a tome next to it, so they're only read when they're needed"""
+    
+    with open(path + "history/" + tome + ".hashes", "w") as file:
+        json.dump({"root": hashes["root"], "cats": hashes["cats"], "offsets": hashes.get("offsets")}, file)
+
+
+def load_tome_hashes(tome, entry):
+    """Return the hashes of a tome (see cached_hashes) and the time it was saved, calculating them if they haven't been saved next to it"""
+    
+    try:
+        with open(tome + ".hashes") as file:
+            hashes = json.load(file)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        hashes = dict(zip(["root", "cats"], book_hashes(load_json(tome))))
+    hashes["time"] = entry["time"]
+    return hashes
+
+
+def tome_hashes(path, save=True):
+    """
+    Return a list of (tome path, manifest entry) of the tomes in history, latest first, see load_manifest for the entries
+    The root hash of each tome is in the manifest, the rest of the hashes are next to each tome and can be read with load_tome_hashes.
+    Hashes of tomes saved while the book's hashes weren't cached are calculated here.
+    save: [bool] whether to write the calculated hashes (and a new manifest, see load_manifest) into history
+    """
+    
+    manifest = load_manifest(path, save)
+    found = []
+    missing = False
+    for entry in reversed(manifest["tomes"]):
+        if not entry.get("root"):
+            try:
+                hashes = dict(zip(["root", "cats"], book_hashes(load_json(path + "history/" + entry["file"]))))
+            except (FileNotFoundError,) + DECODE_ERRORS:
+                continue
+            entry["root"], entry["categories"] = hashes["root"], len(hashes["cats"])
+            if save:
+                save_tome_hashes(path, entry["file"], hashes)
+            missing = True
+        found.append((path + "history/" + entry["file"], entry))
+    
+    if missing and save:
+        save_manifest(path, manifest)
+    return found
+
+
+def parse_time(text):
+    """Return the time (seconds since epoch) of text like '2h' (ago), '2024-10-19', '2024-10-19 15:30' or '15:30' (today), None if it isn't one"""
+    
+    ago = parse_duration(text.removesuffix("ago"))
+    if ago is not None:
+        return time.time() - ago
+    for time_format in ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%H:%M:%S", "%H:%M"]:
+        try:
+            moment = datetime.datetime.strptime(text.strip(), time_format)
+        except ValueError:
+            continue
+        if not time_format.startswith("%Y"):
+            moment = datetime.datetime.combine(datetime.date.today(), moment.time())
+        return moment.timestamp()
+    return None
+
+
+def format_age(seconds):
+    """Return how long ago something happened as text, e.g. '5 minutes ago'"""
+    
+    for unit, length in [("day", 86400), ("hour", 3600), ("minute", 60)]:
+        if seconds >= length:
+            amount = int(seconds // length)
+            return f"{amount} {unit}{'s' if amount > 1 else ''} ago"
+    return "just now"
+
+
+def history(path, conf):
+    """Print the versions of the book in history, latest first, numbered the same way as for undo"""
+    
+    tomes = load_manifest(path)["tomes"]
+    if not tomes:
+        print(color("There are no earlier versions of the book in history", conf, "yellow"))
+        return
+    
+    now = time.time()
+    print(color("Versions of the book by the time they were replaced:", conf, "black", "bold"))
+    for n, entry in enumerate(reversed(tomes), 1):
+        moment = datetime.datetime.fromtimestamp(entry["time"]).strftime("%Y-%m-%d %H:%M:%S")
+        cats = f"{entry['categories']} categories" if entry.get("categories") is not None else ""
+        print(f"{n:>4}  {moment}  {color(format_age(now - entry['time']).ljust(16), conf, 'cyan')}  {entry['size'] / 1024:>8.1f} KB  {cats}")
+
+
+def undo(path, times=1, to=None):
+    """Write a tome to book and delete it and the tomes after it from history. to: [str] the time to return to (see parse_time), instead of a number of times"""
+    
+    manifest = load_manifest(path)
+    tomes = manifest["tomes"]
+    if to:
+        # the book as it was at that time was replaced by the first save after it
+        moment = parse_time(to)
+        if moment is None:
+            exit("The time must be like '2h', '3d', '2024-10-19', '2024-10-19 15:30' or '15:30'.")
+        later = [i for i, x in enumerate(tomes) if x["time"] > moment]
+        if not later:
+            exit("The book hasn't changed since then.")
+        index = later[0]
+    else:
+        if not times:
+            times = 1
+        
+        # check that times is a number
+        if not str(times).isnumeric() or not int(times):
+            exit("The number of times to undo must be a positive integer.")
+        times = int(times)
+        if times > len(tomes):
+            exit(f"Not enough earlier versions in history ({len(tomes)}). Try a smaller number.")
+        index = len(tomes) - times
+    tome = tomes[index]["file"]
+    
+    # write correct tome to book, keeping its compression, only this tome is decompressed
+    try:
+        with open(path + "history/" + tome, "rb") as tome_file:
+            data = tome_file.read()
+        ancient_texts = json.loads(decompress(data))
+        write_book(path, ancient_texts, detect_compression(data))
     except FileNotFoundError:
-        exit(f"The ancient tome called tome{times} seems to be lost somewhere. Try a smaller number.")
-    
-    # decrement tomes
-    all_files = os.listdir(path + "history")
-    for tome in sorted([x for x in all_files if x.startswith("tome")]):
-        tome_num = int(tome[4:])
-        if tome_num <= times:
-            # delete tomes that are too recent
-            os.remove(path + "history/tome" + str(tome_num))
+        exit(f"The ancient tome called {tome} seems to be lost somewhere.")
+    except DECODE_ERRORS:
+        exit(f"The ancient texts in {tome} seem untranslateable.")
+    
+    # delete the restored tome and the ones after it
+    moment = tomes[index]["time"]
+    for entry in tomes[index:]:
+        for file in [entry["file"], entry["file"] + ".hashes"]:
+            try:
+                os.remove(path + "history/" + file)
+            except FileNotFoundError:
+                pass
+    del tomes[index:]
+    # the tiers of the remaining tomes don't change, but none of them is past the end anymore
+    if "starts" in manifest:
+        manifest["starts"] = [min(x, index) for x in manifest["starts"]]
+        manifest["arrived"] = min(manifest["arrived"], index)
+    save_manifest(path, manifest)
+    print("Returned the book to the version replaced at " + datetime.datetime.fromtimestamp(moment).strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def common_ancestor(path, root, other_path, other_root):
+    """
+    Find the latest version of the book in this data directory that the other one has had as well
+    Returns (file, hashes) of it (see cached_hashes), or None if there isn't one
+    """
+    
+    # find the roots of all versions of the other book, don't write into the other data directory
+    other_roots = {other_root} | {x["root"] for _, x in tome_hashes(other_path, save=False)}
+    
+    # go back in history until finding a version that's one of those
+    if root in other_roots:
+        return path + "book", None
+    for tome, entry in tome_hashes(path):
+        if entry["root"] in other_roots:
+            return tome, load_tome_hashes(tome, entry)
+    return None
+
+
+def merge_fields(local, other, base, skip, label, changes, conflicts, conf):
+    """
+    Three-way merge the fields of two versions of a category or an item, returns the merged dict
+    local, other, base: [dict] the versions to merge and their common ancestor (None if unknown)
+    skip: [list] keys not to merge
+    label: [str] name of the entry for printing changes and conflicts
+    changes, conflicts: [list] where to add descriptions of changes and conflicts
+    """
+    
+    absent = object()  # tells apart a missing key from a value of None
+    merged = {}
+    for key in list(local) + [x for x in other if x not in local]:
+        if key in skip:
+            merged[key] = local.get(key)
+            continue
+        loc, oth = local.get(key, absent), other.get(key, absent)
+        base_value = base.get(key, absent) if base is not None else None
+        
+        if loc == oth or base is not None and oth == base_value:
+            value = loc  # same on both sides or changed only here
+        elif base is not None and loc == base_value:
+            value = oth  # changed only in the other book
+            changes.append(f"{label}: {color(str(shorten(None if loc is absent else loc)), conf, 'red')} -> {color(str(shorten(None if oth is absent else oth)), conf, 'green')}")
+        else:
+            value = loc  # changed on both sides, keep the local value
+            conflicts.append(f"{label}: kept '{shorten(None if loc is absent else loc)}' over '{shorten(None if oth is absent else oth)}'")
+        
+        if value is not absent:
+            merged[key] = value
+    return merged
+
+
+def merge_entries(local, other, base, key, label, changes, conflicts, conf, merge, same=lambda x, y: x == y):
+    """
+    Three-way merge two lists of categories or items, returns the merged list
+    local, other, base: [list] the versions to merge and their common ancestor (None if unknown)
+    key: [function] returns the value used to match the same entry in different versions
+    label: [function] returns the name of an entry for printing changes and conflicts
+    merge: [function] merges two different versions of an entry, called as merge(local, other, base)
+    same: [function] tells if two versions of an entry are equal
+    """
+    
+    other_map = {key(x): x for x in other}
+    base_map = {key(x): x for x in base} if base is not None else {}
+    local_keys = {key(x) for x in local}
+    
+    merged = []
+    for entry in local:
+        oth, base_entry = other_map.get(key(entry)), base_map.get(key(entry))
+        if oth is None:
+            if base_entry is not None and same(base_entry, entry):
+                changes.append(color(f"- {label(entry)}", conf, "red"))  # removed in the other book
+                continue
+            if base_entry is not None:
+                conflicts.append(f"{label(entry)}: changed here but removed in the other book, kept")
+            merged.append(entry)
+        elif same(oth, entry):
+            merged.append(entry)
+        else:
+            merged.append(merge(entry, oth, base_entry))
+    
+    # add entries that only exist in the other book, unless they have been removed here
+    for oth in other:
+        if key(oth) in local_keys:
+            continue
+        base_entry = base_map.get(key(oth))
+        if base_entry is not None and same(base_entry, oth):
+            continue
+        if base_entry is not None:
+            conflicts.append(f"{label(oth)}: removed here but changed in the other book, restored")
+        changes.append(color(f"+ {label(oth)}", conf, "green"))
+        merged.append(oth)
+    
+    return merged
+
+
+def unique_entries(entries, local, key, field, fold, rename, label, conflicts):
+    """
+    Make a field unique among merged categories or items, as addcat, add and editcat require, returns the list with the clashing entries renamed
+    The entry that has the value in this book keeps it, the others get the first free value from rename and the clash is reported as a conflict.
+    local: [list] the entries in this book
+    key: [function] returns the value used to match the same entry in different versions, as for merge_entries
+    fold: [function] returns the form of a value that has to be unique, e.g. lowercase for names
+    rename: [function] returns a value with a number (starting at 2) added to it
+    """
+    
+    taken = collections.Counter(fold(x[field]) for x in entries)
+    if all(x == 1 for x in taken.values()):
+        return entries
+    
+    # keep the value on the entry that had it here, or on the first one if it's new on both sides
+    owners = {fold(x[field]): key(x) for x in local}
+    keepers = {}
+    for entry in entries:
+        value = fold(entry[field])
+        if taken[value] > 1 and (value not in keepers or key(entry) == owners.get(value)):
+            keepers[value] = entry
+    
+    unique = []
+    for entry in entries:
+        value = fold(entry[field])
+        if taken[value] > 1 and keepers[value] is not entry:
+            n = 2
+            while fold(rename(entry[field], n)) in taken:
+                n += 1
+            new_value = rename(entry[field], n)
+            taken[fold(new_value)] += 1
+            conflicts.append(f"{label(entry)}: {field} '{entry[field]}' is already used here, changed to '{new_value}'")
+            entry = dict(entry, **{field: new_value})
+        unique.append(entry)
+    return unique
+
+
+def sync(path, args, book, conf):
+    """Merge the book in another data directory into this one, returns a modified book (list)"""
+    
+    if not args:
+        args = input("Data directory to sync with: ")
+    if not args:
+        exit("No data directory provided.")
+    other_path = os.path.join(os.path.expanduser(args), "")
+    if not os.path.isfile(other_path + "book"):
+        exit(f"No book found in '{other_path}'.")
+    if os.path.samefile(other_path, path):
+        exit("Can't sync a data directory with itself.")
+    
+    # compare root hashes, using the cached hashes if possible
+    hashes = cached_hashes(path)
+    root, cat_hashes = (hashes["root"], hashes["cats"]) if hashes else book_hashes(book)
+    other_hashes = cached_hashes(other_path)
+    if not other_hashes:
+        try:
+            other_hashes = dict(zip(["root", "cats"], book_hashes(load_json(other_path + "book"))))
+        except DECODE_ERRORS:
+            exit(f"Error decoding file '{other_path}book'")
+    if other_hashes["root"] == root:
+        print(color("Already in sync", conf, "yellow"))
+        exit()
+    
+    # categories with the same hash are the same, so only load the ones from the other book that aren't in this one
+    known = {x: y for x, y in zip(cat_hashes, book)}
+    local_cats = {id(x) for x in book}
+    loaded = load_cats(other_path + "book", other_hashes, [i for i, x in enumerate(other_hashes["cats"]) if x not in known])
+    other = [known[x] if x in known else loaded[i] for i, x in enumerate(other_hashes["cats"])]
+    known.update({x: y for x, y in zip(other_hashes["cats"], other)})
+    
+    # likewise for the common ancestor
+    ancestor = common_ancestor(path, root, other_path, other_hashes["root"])
+    base = None
+    if ancestor and ancestor[1] is None:
+        base = book
+    elif ancestor:
+        tome, base_hashes = ancestor
+        loaded = load_cats(tome, base_hashes, [i for i, x in enumerate(base_hashes["cats"]) if x not in known])
+        base = [known[x] if x in known else loaded[i] for i, x in enumerate(base_hashes["cats"])]
+        known.update({x: y for x, y in zip(base_hashes["cats"], base)})
+    
+    # books that haven't been opened since stable IDs were added get the same IDs they would get when opened,
+    # only categories that weren't already in this book can be missing them
+    for version in [other, base]:
+        if version and any(not x.get("id") or not all(y.get("id") for y in x["items"]) for x in version if id(x) not in local_cats):
+            assign_ids(version)
+    
+    changes = []
+    conflicts = []
+    
+    def merge_cat(local, oth, base_cat):
+        cat = merge_fields(local, oth, base_cat, ["items", "id"], local["name"], changes, conflicts, conf)
+        cat["items"] = merge_entries(local["items"], oth["items"], base_cat["items"] if base_cat else None,
+                                     lambda x: x.get("id") or x["name"].lower(), lambda x: f"{cat['name']} / {x['name']}", changes, conflicts, conf,
+                                     lambda x, y, z: merge_fields(x, y, z, ["id"], f"{cat['name']} / {x['name']}", changes, conflicts, conf))
+        return cat
+    
+    # compare categories by their hashes, so those that are the same on both sides are skipped without looking at their items
+    cat_ids = {id(y): x for x, y in known.items()}
+    merged = merge_entries(book, other, base, lambda x: x.get("id") or x["short"], lambda x: x["name"], changes, conflicts, conf, merge_cat,
+                           lambda x, y: cat_ids[id(x)] == cat_ids[id(y)])
+    
+    # changes from both sides can give two entries the same name, which the other commands don't allow
+    merged = unique_entries(merged, book, lambda x: x.get("id") or x["short"], "short", lambda x: x, lambda x, n: x[:8 - len(str(n))] + str(n),
+                            lambda x: x["name"], conflicts)
+    merged = unique_entries(merged, book, lambda x: x.get("id") or x["short"], "name", str.lower, lambda x, n: f"{x} ({n})", lambda x: x["name"], conflicts)
+    local_items = {x.get("id") or x["short"]: x["items"] for x in book}
+    for i, cat in enumerate(merged):
+        items = unique_entries(cat["items"], local_items.get(cat.get("id") or cat["short"], []), lambda x: x.get("id") or x["name"].lower(), "name", str.lower,
+                               lambda x, n: f"{x} ({n})", lambda x: f"{cat['name']} / {x['name']}", conflicts)
+        if items is not cat["items"]:
+            merged[i] = dict(cat, items=items)
+    
+    if conflicts:
+        print(color("Conflicts:", conf, "yellow") + "\n" + "\n".join(conflicts))
+    if not changes:
+        print(color("Nothing to merge from the other book", conf, "yellow"))
+        exit()
+    
+    print(f"Merged with '{other_path}'" + (" (no common history found)" if base is None else ""))
+    print("Changes:\n" + "\n".join(changes))
+    
+    return merged
+
+
+def moved_entries(old_keys, new_keys):
+    """
+    Return the keys found in both lists that changed places relative to the others
+    The entries that kept their order are the longest increasing subsequence of their old positions in the new order, the rest were moved.
+    """
+    
+    if old_keys == new_keys:
+        return set()
+    old_pos = {x: i for i, x in enumerate(old_keys)}
+    order = [x for x in new_keys if x in old_pos]
+    
+    # patience sorting, tails[n] is the smallest old position ending an increasing subsequence of length n + 1
+    tails = []
+    tail_keys = []
+    previous = {}
+    for key in order:
+        n = bisect.bisect_left(tails, old_pos[key])
+        previous[key] = tail_keys[n - 1] if n else None
+        if n == len(tails):
+            tails.append(old_pos[key])
+            tail_keys.append(key)
+        else:
+            tails[n] = old_pos[key]
+            tail_keys[n] = key
+    
+    kept = set()
+    key = tail_keys[-1] if tail_keys else None
+    while key is not None:
+        kept.add(key)
+        key = previous[key]
+    return set(order) - kept
+
+
+def book_version(path, n, tomes):
+    """Return (file, hashes, description) of a version of the book, 0 being the current book and 1 and above the tomes in history (latest first, see tome_hashes)"""
+    
+    if n == 0:
+        hashes = cached_hashes(path)
+        if not hashes:
+            try:
+                hashes = dict(zip(["root", "cats"], book_hashes(load_json(path + "book"))))
+            except DECODE_ERRORS:
+                exit("Error decoding file 'book'")
+        return path + "book", hashes, "the current book"
+    if n > len(tomes):
+        exit(f"Not enough earlier versions in history ({len(tomes)}). Try a smaller number.")
+    tome, hashes = tomes[n - 1][0], load_tome_hashes(*tomes[n - 1])
+    return tome, hashes, f"version {n} (replaced at {datetime.datetime.fromtimestamp(hashes['time']).strftime('%Y-%m-%d %H:%M:%S')})"
+
+
+def diff_versions(old_file, old_hashes, new_file, new_hashes):
+    """
+    Compare two versions of the book, returns a list of changes from the old one to the new one
+    Categories with the same hash in both versions are only loaded if they were moved, other categories and items are matched by their stable IDs.
+    Each change is a dict with the keys 'change' (one of 'added', 'removed', 'renamed', 'moved', 'modified'), 'category' (its name), 'id',
+    'item' (its name, only for items), 'field' (for renamed and modified), 'old' and 'new' (the values, positions as shown by ls for moved) and 'items' (for added and removed categories)
+    """
+    
+    old_cats, new_cats = old_hashes["cats"], new_hashes["cats"]
+    old_known, new_known = set(old_cats), set(new_cats)
+    old_loaded = load_cats(old_file, old_hashes, [i for i, x in enumerate(old_cats) if x not in new_known])
+    new_loaded = load_cats(new_file, new_hashes, [i for i, x in enumerate(new_cats) if x not in old_known])
+    
+    # versions saved before stable IDs were added get the same IDs they would get when opened, which needs all their categories
+    for file, hashes, loaded in [(old_file, old_hashes, old_loaded), (new_file, new_hashes, new_loaded)]:
+        if any(not x.get("id") or not all(y.get("id") for y in x["items"]) for x in loaded.values()):
+            rest = load_cats(file, hashes, [i for i in range(len(hashes["cats"])) if i not in loaded])
+            assign_ids([loaded[i] if i in loaded else rest[i] for i in range(len(hashes["cats"]))])
+    
+    # match the changed categories by their stable IDs, unchanged ones by their hashes
+    def cat_key(cat):
+        return cat.get("id") or cat["short"]
+    old_keys = [cat_key(old_loaded[i]) if i in old_loaded else x for i, x in enumerate(old_cats)]
+    new_keys = [cat_key(new_loaded[i]) if i in new_loaded else x for i, x in enumerate(new_cats)]
+    old_index = {x: i for i, x in enumerate(old_keys)}
+    new_index = {x: i for i, x in enumerate(new_keys)}
+    
+    # unchanged categories that were moved have to be loaded to be named
+    moved = moved_entries(old_keys, new_keys)
+    old_loaded.update(load_cats(old_file, old_hashes, [old_index[x] for x in moved if old_index[x] not in old_loaded]))
+    new_loaded.update(load_cats(new_file, new_hashes, [new_index[x] for x in moved if new_index[x] not in new_loaded]))
+    
+    # items of all the loaded categories, an item moved to another category changes both, so both are loaded
+    def items(loaded):
+        found = {}
+        for i, cat in loaded.items():
+            for j, item in enumerate(cat["items"]):
+                found[item.get("id") or (cat_key(cat), item["name"].lower())] = (i, j, item)
+        return found
+    old_items, new_items = items(old_loaded), items(new_loaded)
+    
+    changes = []
+    
+    def fields(old, new, skip, entry):
+        for field in [x for x in old if x not in skip] + [x for x in new if x not in skip and x not in old]:
+            if old.get(field) != new.get(field):
+                changes.append(dict(entry, change="renamed" if field in ["name", "short"] else "modified", field=field, old=old.get(field), new=new.get(field)))
+    
+    for i, cat in sorted(new_loaded.items()):
+        key = new_keys[i]
+        entry = {"category": cat["name"], "id": cat.get("id")}
+        item_keys = [x.get("id") or (key, x["name"].lower()) for x in cat["items"]]
+        reordered = set()
+        if key not in old_index:
+            changes.append(dict(entry, change="added", items=len([x for x in item_keys if x not in old_items])))
+        else:
+            old_cat = old_loaded[old_index[key]]
+            if key in moved:
+                changes.append(dict(entry, change="moved", old=str(old_index[key] + 1), new=str(i + 1)))
+            fields(old_cat, cat, ["items", "id"], entry)
+            
+            # items that stayed in the category and changed places relative to each other
+            reordered = moved_entries([x.get("id") or (key, x["name"].lower()) for x in old_cat["items"]], item_keys)
+        
+        for j, item in enumerate(cat["items"]):
+            item_key = item_keys[j]
+            entry = {"category": cat["name"], "item": item["name"], "id": item.get("id")}
+            if item_key not in old_items:
+                if key in old_index:
+                    changes.append(dict(entry, change="added"))
+                continue
+            old_i, old_j, old_item = old_items[item_key]
+            if old_keys[old_i] != key or item_key in reordered:
+                changes.append(dict(entry, change="moved", old=f"{old_i + 1}.{old_j + 1}", new=f"{i + 1}.{j + 1}"))
+            if old_item != item:
+                fields(old_item, item, ["id"], entry)
+    
+    # removed items and categories, items moved elsewhere are already listed above
+    for i, cat in sorted(old_loaded.items()):
+        left = [x for x in cat["items"] if (x.get("id") or (old_keys[i], x["name"].lower())) not in new_items]
+        if old_keys[i] not in new_index:
+            changes.append({"category": cat["name"], "id": cat.get("id"), "change": "removed", "items": len(left)})
             continue
-        # decrement everything else
-        os.rename(path + "history/tome" + str(tome_num), path + "history/tome" + str(tome_num - times)) 
+        name = new_loaded[new_index[old_keys[i]]]["name"]
+        changes.extend({"category": name, "item": x["name"], "id": x.get("id"), "change": "removed"} for x in left)
+    return changes
+
+
+def diff(path, args, conf, as_json=False):
+    """Show the changes between two versions of the book, by default between the latest tome in history and the current book"""
+    
+    numbers = args.split() or ["1"]
+    if len(numbers) > 2 or not all(x.isnumeric() for x in numbers):
+        exit("Versions must be given as up to two numbers, 0 being the current book and 1 the latest version in history (see `boar history`).")
+    numbers = [int(x) for x in numbers] + [0] * (2 - len(numbers))
+    
+    tomes = tome_hashes(path) if any(numbers) else []
+    old_file, old_hashes, old_label = book_version(path, numbers[0], tomes)
+    new_file, new_hashes, new_label = book_version(path, numbers[1], tomes)
+    changes = [] if old_hashes["root"] == new_hashes["root"] else diff_versions(old_file, old_hashes, new_file, new_hashes)
+    
+    if as_json:
+        print(json.dumps({"from": old_label, "to": new_label, "changes": changes}, indent=2, default=plain))
+        return
+    if not changes:
+        print(color(f"No differences between {old_label} and {new_label}", conf, "yellow"))
+        return
+    
+    def value(field, text):
+        if field == "tags":
+            return ", ".join(text or []) or "None"
+        return str(shorten(text)) if field in ["desc", "link"] else str(text)
+    
+    lines = []
+    for change in changes:
+        label = change["category"] + (f" / {change['item']}" if "item" in change else "")
+        if change["change"] == "added":
+            lines.append(color(f"+ {label}" + (f" with {change['items']} items" if "items" in change else ""), conf, "green"))
+        elif change["change"] == "removed":
+            lines.append(color(f"- {label}" + (f" with {change['items']} items" if "items" in change else ""), conf, "red"))
+        elif change["change"] == "moved":
+            lines.append(f"{label}: {color(change['old'], conf, 'red')} -> {color(change['new'], conf, 'green')}")
+        else:
+            old, new = value(change["field"], change["old"]), value(change["field"], change["new"])
+            lines.append(f"{label} ({change['field']}): {color(old, conf, 'red')} -> {color(new, conf, 'green')}")
+    print(f"Changes from {old_label} to {new_label}:\n" + "\n".join(lines))
 
 
 def export(path, args, book, conf):
@@ -650,7 +2218,7 @@ def export(path, args, book, conf):
     # create the categories
     categories = []
     for cat in book:
-        categ = [f"<h3 id='{cat['short']}'>{bold1}{cat['name']}{bold2}</h3>", "<ul>"]
+        categ = [f"<h3 id='{cat['short']}'><a id='{cat.get('id', '')}'></a>{bold1}{cat['name']}{bold2}</h3>", "<ul>"]
         for item in cat["items"]:
             # set link if it's present
             if item["link"]:
@@ -660,10 +2228,27 @@ def export(path, args, book, conf):
                 link1, link2 = "<span>", "</span>"  # span tags for correct text color
             # set desc if present
             desc = item["desc"] if item["desc"] else "..."
-            categ.append(f"<li>{bold1}{link1}{item['name']}{link2}{bold2} : {desc}</li>")
+            # set tags if present, linking to their sections
+            tags = "".join(f" <a href='#tag-{x}'>#{x}</a>" for x in item.get("tags") or [])
+            categ.append(f"<li id='{item.get('id', '')}'>{bold1}{link1}{item['name']}{link2}{bold2} : {desc}{tags}</li>")
+        categ.append("</ul>")
+        categories.append("\n".join(categ))
+    
+    # create a section for each tag, listing the items with it
+    index = tag_index(book)
+    if index:
+        categories.append(f"<h2 id='tags'>{bold1}Tags{bold2}</h2>")
+    for tag in sorted(index):
+        categ = [f"<h3 id='tag-{tag}'>{bold1}#{tag}{bold2}</h3>", "<ul>"]
+        for i, j in sorted(index[tag]):
+            cat, item = book[i], book[i]["items"][j]
+            link1, link2 = (f"<a href='{item['link']}'>", "</a>") if item["link"] else ("<span>", "</span>")
+            categ.append(f"<li>{bold1}{link1}{item['name']}{link2}{bold2} (<a href='#{cat['short']}'>{cat['name']}</a>)</li>")
         categ.append("</ul>")
         categories.append("\n".join(categ))
     categories_joined = "\n".join(categories)
+    if index:
+        chapters_joined += f"\n<li style='line-height: 23px;'>{bold1}<a href='#tags'>Tags</a>{bold2}</li>"
     
     # build the HTML
     base = f"""<!DOCTYPE html>
@@ -705,6 +2290,58 @@ def export(path, args, book, conf):
         print("Exported HTML to " + path + "boar.html")
 
 
+def write_completions(path, book):
+    """
+    Write the sorted completion index used by boar_complete.py to the data directory
+    Each line is '<kind> <key>\t<description>', kind being 'x' for commands, 'c' for category short names, 'i' for item IDs and 'n' for item names
+    (keyed by category short name and lowercase item name), so completions can be found with a binary search on the key.
+    """
+    
+    lines = [f"x {x}" for x in COMMANDS]
+    for cat in book:
+        lines.append(f"c {cat['short']}\t{cat['name']}")
+        for j, item in enumerate(cat["items"], 1):
+            name = item["name"].replace("\n", " ").replace("\t", " ")
+            lines.append(f"i {cat['short']}.{j}\t{name}")
+            lines.append(f"n {cat['short']} {name.lower()}\t{name}")
+    lines.sort()
+    
+    with open(path + "completion", "w") as file:
+        file.write("\n".join(lines))
+
+
+def completion_script(shell):
+    """
+    Return the script for `boar completion <shell>`, None for an unknown shell
+    The scripts run boar_complete.py from the directory of this file as a module, so Python caches its bytecode and boar.py isn't compiled on every Tab press.
+    """
+    
+    command = f"PYTHONPATH={shlex.quote(os.path.dirname(os.path.realpath(__file__)))} {shlex.quote(sys.executable)} -m boar_complete"
+    scripts = {
+        "bash": r"""_boar() {
+    local line
+    COMPREPLY=()
+    while IFS= read -r line; do
+        [[ -n $line ]] && COMPREPLY+=("$(printf '%q' "${line%%$'\t'*}")")
+    done < <(COMMAND "${COMP_WORDS[@]:1:COMP_CWORD}" 2>/dev/null)
+}
+complete -o default -F _boar boar
+""",
+        "zsh": r"""#compdef boar
+_boar() {
+    local -a candidates
+    candidates=("${(@f)$(COMMAND "${(@)words[2,CURRENT]}" 2>/dev/null | awk -F '\t' '{ gsub(/:/, "\\:", $1); print ($2 == "" ? $1 : $1 ":" $2) }')}")
+    _describe 'boar' candidates
+}
+compdef _boar boar
+""",
+        # fish takes the command inside single quotes, so quote the paths with double quotes there
+        "fish": r"""complete -c boar -f -a '(env COMMAND (commandline -opc)[2..-1] (commandline -ct))'
+""".replace("COMMAND", f'PYTHONPATH="{os.path.dirname(os.path.realpath(__file__))}" "{sys.executable}" -m boar_complete'),
+    }
+    return scripts[shell].replace("COMMAND", command) if shell in scripts else None
+
+
 def color(text, conf, color, style="regular"):
     """Add ANSI color codes to change the text color and style if configured so, at the end reset color"""
     colors = {
@@ -735,16 +2372,19 @@ def configure(path, args, conf):
     """Configure options"""
     
     mod_conf = conf.copy()
+    mod_conf.pop("show ids", None)  # set from the command line for this run only, not an option
     
     # display options with their current values and ask for option to change
     opt = input(f"""Which option to configure?
-1: history length (currently {conf['history length']})   {color('- amount of previous versions stored for undo', conf, "black", "bold")}
+1: history length (currently {conf['history length']})   {color('- amount of latest previous versions always kept for undo, 0 disables history', conf, "black", "bold")}
 2: disable colors (currently {conf['disable colors']})   {color('- disable colors and styling of output', conf, "black", "bold")}
 3: show links (currently {conf['show links']})   {color('- whether or not to print out item links when showing full book (links always shown when showing a single category)', conf, "black", "bold")}
 4: clear (currently {conf['clear']})   {color('- string that is used to clear a value when editing an item, as an empty string indicates leaving value unchanged', conf, "black", "bold")}
 5: export light by default (currently {conf['export light by default']})   {color('- default color scheme when exporting (can be overridden with `light` or `dark` argument)', conf, "black", "bold")}
 6: max display (currently {conf['max display']})   {color('- maximum number of items to display when showing full book before defaulting to lscat', conf, "black", "bold")}
 7: show all (currently {conf['show all']})   {color('- string to indicate showing all items and not defaulting to lscat with many items', conf, "black", "bold")}
+8: compression (currently {conf.get('compression', 'none')})   {color('- compression of the book and history when saved, one of none, gzip, lzma, zlib (lzma is the smallest but much slower to save)', conf, "black", "bold")}
+9: history retention (currently {conf.get('history retention', RETENTION)})   {color("- how long older versions are kept, e.g. '1h:all,1d:1h,30d:1d' keeps every version for an hour, one per hour for a day and one per day for 30 days", conf, "black", "bold")}
 Option number (leave blank to abort): """)
     
     # if option specified, ask for new value to be set
@@ -794,6 +2434,16 @@ Option number (leave blank to abort): """)
         if not inp:
             exit("String can't be empty")
         mod_conf["show all"] = inp
+    elif opt == "8":
+        inp = input("Set compression (none/gzip/lzma/zlib): ").lower()
+        if inp not in ["none", "gzip", "lzma", "zlib"]:
+            exit("Value must be one of 'none', 'gzip', 'lzma', 'zlib'")
+        mod_conf["compression"] = inp
+    elif opt == "9":
+        inp = input("Set history retention (max age:interval, ...): ").lower()
+        if parse_retention(inp) is None:
+            exit("Value must be a comma separated list of 'max age:interval', where durations are like '30m', '2h', '7d' or '4w', max age can be 'forever' and interval 'all', and max ages increase")
+        mod_conf["history retention"] = inp
     elif not opt:
         exit()
     else:
@@ -805,21 +2455,41 @@ Option number (leave blank to abort): """)
 
 
 
+# all operations that can be passed from the command line
+COMMANDS = ["add", "addcat", "ls", "lscat", "rm", "rmcat", "edit", "editcat", "reset", "undo", "export", "configure", "sync", "completion", "query", "history", "diff"]
+
+
 def main():
     """Main function to run the app"""
     
+    # completion is done before anything else to keep it fast, the shell scripts run boar_complete directly
+    if sys.argv[1:2] == ["__complete"]:
+        try:
+            import boar_complete
+        except ImportError:
+            exit("Completion needs boar_complete.py in the same directory as boar.py.")
+        boar_complete.complete(sys.argv[2:])
+        exit()
+    
     # create partser to parse arguments passed from the command line
     parser = argparse.ArgumentParser(description="Add, edit and view a list of short references.")
-    parser.add_argument("arguments", nargs="*", help="can be any of 'ls', 'add', 'addcat', 'rm', 'rmcat', 'edit', 'editcat', 'undo', 'export', 'configure', 'reset'")  # argument to gather all input from the command line into a list
+    parser.add_argument("arguments", nargs="*", help="can be any of 'ls', 'add', 'addcat', 'rm', 'rmcat', 'edit', 'editcat', 'undo', 'export', 'configure', 'reset', 'sync', 'completion', 'query', 'history', 'diff'")  # argument to gather all input from the command line into a list
     parser.add_argument("-c", "--nocolor", action="store_true", help="disable colors and styling of output")
-    args = parser.parse_args().arguments  # a list of all non-positional input
-    nocolor = parser.parse_args().nocolor
+    parser.add_argument("-t", "--tag", default="", help="with ls, only show items that have all of the given comma separated tags")
+    parser.add_argument("-n", "--not-tag", default="", help="with ls, only show items that have none of the given comma separated tags")
+    parser.add_argument("-i", "--ids", action="store_true", help="with ls and query, show the stable IDs of categories and items")
+    parser.add_argument("--to", help="with undo, return the book to how it was at a time like '2h' (ago), '2024-10-19 15:30' or '15:30'")
+    parser.add_argument("-j", "--json", action="store_true", help="with diff, print the changes as JSON")
+    parser.add_argument("-e", "--editor", action="store_true", help="with edit, edit a category or the whole book in a text editor")
+    parsed = parser.parse_intermixed_args()
+    args = parsed.arguments  # a list of all non-positional input
+    nocolor = parsed.nocolor
     conf = {"disable colors": nocolor}
     
     # check if passed argument for action is a valid one and store it
     if not args:
         act = "ls"
-    elif args[0] in ["add", "addcat", "ls", "lscat", "rm", "rmcat", "edit", "editcat", "reset", "undo", "export", "configure"]:
+    elif args[0] in COMMANDS:
         act = args.pop(0)
     else:
         exit("Invalid operation.")
@@ -827,6 +2497,14 @@ def main():
     # convert remaining arguments to a string
     args = " ".join(args)
     
+    # print a completion script, doesn't need the data directory
+    if act == "completion":
+        script = completion_script(args)
+        if script is None:
+            exit("Shell must be one of bash, zsh, fish")
+        print(script, end="")
+        exit()
+    
     # path to data directory
     home = os.path.expanduser("~")
     path = home + "/.boar/"
@@ -850,22 +2528,8 @@ def main():
         if prompt("Directory 'history' missing in directory. Create it now?"):
             create_defaults(path, create_history_dir=True)
     
-    # do operations that do not require loading data and config
-    if act == "undo":
-        undo(path, args)
-        exit()
-    
-    # load data and config from file
-    with open(path + "book") as book_file, open(path + "conf") as conf_file:
-        # try reading the book file
-        try:
-            book = json.load(book_file)
-        except json.decoder.JSONDecodeError:
-            print("Error decoding file 'book'")
-            if prompt("Overwrite the file 'book' with defaults?"):
-                create_defaults(path, create_book=True)
-            book = json.load(book_file)
-        
+    # load config from file
+    with open(path + "conf") as conf_file:
         # try reading the config file
         try:
             conf = json.load(conf_file)
@@ -876,15 +2540,44 @@ def main():
             conf = json.load(conf_file)
         if nocolor:
             conf["disable colors"] = True
+        conf["show ids"] = parsed.ids
+    
+    # do operations that do not require loading data
+    if act == "undo":
+        undo(path, args, parsed.to)
+        exit()
+    elif act == "history":
+        history(path, conf)
+        exit()
+    elif act == "diff":
+        diff(path, args, conf, parsed.json)
+        exit()
+    
+    # try reading the book file
+    try:
+        book = load_json(path + "book")
+    except DECODE_ERRORS:
+        print("Error decoding file 'book'")
+        if prompt("Overwrite the file 'book' with defaults?"):
+            create_defaults(path, create_book=True)
+        book = load_json(path + "book")
+    
+    # give stable IDs to categories and items in books made before they existed
+    if assign_ids(book):
+        write_book(path, book, conf.get("compression", "none"))
+    elif not os.path.exists(path + "completion"):
+        write_completions(path, book)
     
     # create a variable to later check if the book has been edited
     book_edited = None
     
     # act according to chosen operation
     if act == "ls":
-        ls(args, book, conf)
+        ls(args, book, conf, parse_tags(parsed.tag), parse_tags(parsed.not_tag))
     elif act == "lscat":
         lscat(book, conf)
+    elif act == "query":
+        query(args, book, conf)
     elif act == "addcat":
         book_edited = addcat(args, book, conf)
     elif act == "add":
@@ -895,8 +2588,12 @@ def main():
         book_edited = rm(args, book, conf)
     elif act == "editcat":
         book_edited = editcat(args, book, conf)
+    elif act == "edit" and parsed.editor:
+        book_edited = edit_in_editor(args, book, conf)
     elif act == "edit":
         book_edited = edit(args, book, conf)
+    elif act == "sync":
+        book_edited = sync(path, args, book, conf)
     elif act == "export":
         export(path, args, book, conf)
     elif act == "configure":
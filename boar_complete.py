@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# Shell completion for boar, kept apart from boar.py so that a Tab press only imports this small module (whose bytecode is cached)
+# instead of compiling all of boar.py. Completions are read from the index written by boar.py, see write_completions there.
+
+import os
+import sys
+import mmap
+
+
+def complete_lookup(file, prefix):
+    """Return the lines in a sorted file that start with prefix, found with a binary search without reading the whole file"""
+    
+    try:
+        with open(file, "rb") as index_file:
+            data = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):  # ValueError if the file is empty
+        return []
+    prefix = prefix.encode()
+    
+    # find the start of the first line that's not smaller than prefix
+    low, high = 0, len(data)
+    while low < high:
+        middle = (low + high) // 2
+        start = data.rfind(b"\n", 0, middle) + 1
+        end = data.find(b"\n", start)
+        end = len(data) if end == -1 else end
+        if data[start:end] < prefix:
+            low = end + 1
+        else:
+            high = start
+    
+    # read lines until one doesn't start with prefix
+    found = []
+    while low < len(data):
+        end = data.find(b"\n", low)
+        end = len(data) if end == -1 else end
+        line = data[low:end]
+        if not line.startswith(prefix):
+            break
+        found.append(line.decode())
+        low = end + 1
+    return found
+
+
+def complete(words):
+    """
+    Print completions for the command line, one per line as 'completion\tdescription'
+    words: [list] words after 'boar', the last one being the word to complete
+    """
+    
+    # the same data directory as in boar.py, the index is written there whenever the book is loaded or saved
+    home = os.path.expanduser("~")
+    path = home + "/.boar/" if os.path.exists(home + "/.boar/") else home + "/.config/boar/"
+    index = path + "completion"
+    
+    words = [x for x in words if not x.startswith("-")] or [""]
+    current = words[-1]
+    
+    if len(words) == 1:
+        found = [x[2:] for x in complete_lookup(index, "x " + current)]
+    elif words[0] in ["ls", "add", "editcat", "rmcat"] and len(words) == 2:
+        found = [x[2:] for x in complete_lookup(index, "c " + current)]
+        found += ["all"] if words[0] == "ls" and "all".startswith(current) else []
+    elif words[0] in ["rm", "edit"] and len(words) == 2:
+        # complete item IDs after a category and a dot, categories otherwise
+        kind = "i " if "." in current else "c "
+        found = [x[2:] for x in complete_lookup(index, kind + current.split(",")[-1])]
+        if "," in current:
+            found = [current.rsplit(",", 1)[0] + "," + x for x in found]
+    elif words[0] in ["rm", "edit"] and len(words) > 2:
+        # complete item names after a category, which can have spaces in them, leaving out the words before the current one
+        before = len(" ".join(words[2:-1]) + " ") if len(words) > 3 else 0
+        found = [x.split("\t", 1)[1][before:] for x in complete_lookup(index, f"n {words[1]} {' '.join(words[2:]).lower()}")]
+    elif words[0] == "export" and len(words) == 2:
+        found = [x for x in ["light", "dark"] if x.startswith(current)]
+    elif words[0] == "completion" and len(words) == 2:
+        found = [x for x in ["bash", "zsh", "fish"] if x.startswith(current)]
+    else:
+        found = []
+    
+    print("\n".join(found))
+
+
+if __name__ == "__main__":
+    complete(sys.argv[1:])